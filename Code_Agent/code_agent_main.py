@@ -1,22 +1,195 @@
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
-import os
+import asyncio
 
 from workflow_State.main_state import AgentState
-from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
-from prompts.prompts_list import Code_Agent_Prompt
-from workflow_tools.filesystemtools import read_file, write_file, apply_patch
+from langchain_core.messages import HumanMessage, ToolMessage
+from prompts.prompts_list import (
+    CODE_AGENT_PROMPT,
+    CODE_AGENT_SCENARIOS,
+    build_messages,
+    code_agent_dynamic,
+)
+from workflow_tools.filesystemtools import read_file, write_file, apply_patch, batch, read_text_cached
 from workflow_State.memory_manager import MemoryManager
+from shared.agent_logging import flush_logs, get_logger
+from shared.llm_client import get_chat_model
+from shared.llm_throttler import estimate_tokens, llm_throttler
+from workflow_tools.parallel_tools import (
+    digest_tool_messages,
+    group_tool_results,
+    run_sync,
+    stream_tool_calls,
+)
 
-load_dotenv()
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+logger = get_logger("agent.code")
 
-tools = [read_file, write_file, apply_patch]
-model = ChatOpenAI(model="gpt-4o-mini")
+# Tools the agent may run, either directly or inside a batch call
+tool_map = {t.name: t for t in [read_file, write_file, apply_patch]}
+tools = [*tool_map.values(), batch]
+model = get_chat_model()
 code_model = model.bind_tools(tools)
 
+# Written by the LLM next to its final tool calls; lets a step end as soon as
+# those calls succeed, skipping the "nothing left to do" confirmation turn
+COMPLETION_SIGNAL = "STEP_COMPLETE"
+
 
 def CodeAgent(state: AgentState) -> AgentState:
+    """
+    LangGraph node entry point. The graph stays synchronous; the agent itself
+    runs async so the tool calls of each LLM turn can execute concurrently.
+    """
+    try:
+        return run_sync(_code_agent(state))
+    finally:
+        flush_logs()
+
+
+def _record_tool_results(state: AgentState, run: dict, flat_calls: list, results: list) -> None:
+    """Track files touched by one step's tool calls and update memory."""
+    for tool_call, result in zip(flat_calls, results):
+        tool_name = tool_call["name"]
+        tool_args = tool_call["args"]
+        
+        if isinstance(result, Exception):
+            logger.warning(f"[CodeAgent]   ❌ {tool_name} failed: {result}")
+            continue
+        
+        if tool_name == "write_file":
+            file_path = tool_args.get("path", "unknown")
+            
+            # A failed write changed nothing; don't count it toward the step
+            if not str(result).startswith("File written"):
+                logger.warning(f"[CodeAgent]   ❌ write_file {file_path}: {result}")
+                continue
+            
+            # Keep the written content for review - no need to re-read it from disk
+            state.setdefault("file_contents", {})[file_path] = tool_args.get("content", "")
+            
+            # Determine if this is a new file or modification
+            is_new_file = file_path not in state.get("generated_files", [])
+            
+            if is_new_file:
+                run["files_created"].append(file_path)
+                logger.info(f"[CodeAgent]   ✅ Created: {file_path}")
+                
+                # Update memory: file created
+                MemoryManager.update_file_context(
+                    state,
+                    file_path=file_path,
+                    operation="created",
+                    agent="code_agent"
+                )
+            else:
+                run["files_modified"].append(file_path)
+                logger.info(f"[CodeAgent]   ✅ Modified: {file_path}")
+                
+                # Update memory: file modified
+                MemoryManager.update_file_context(
+                    state,
+                    file_path=file_path,
+                    operation="modified",
+                    agent="code_agent"
+                )
+            
+        elif tool_name == "read_file":
+            file_path = tool_args.get("path", "unknown")
+            run["files_read"].append(file_path)
+            logger.debug(f"[CodeAgent]   📖 Read: {file_path}")
+            
+            # Update memory: file read
+            MemoryManager.update_file_context(
+                state,
+                file_path=file_path,
+                operation="read",
+                agent="code_agent"
+            )
+            
+        elif tool_name == "apply_patch":
+            file_path = tool_args.get("path", "unknown")
+            
+            # A failed patch (snippet not found, ...) left the file untouched
+            if not str(result).startswith("Patch applied"):
+                logger.warning(f"[CodeAgent]   ❌ apply_patch {file_path}: {result}")
+                continue
+            
+            # apply_patch leaves the patched content in the read cache
+            try:
+                state.setdefault("file_contents", {})[file_path] = read_text_cached(file_path)
+            except (OSError, ValueError) as e:
+                # Removed or replaced since the patch; retried when results are collected
+                logger.warning(f"[CodeAgent]   ⚠️  Could not read patched {file_path}: {e}")
+            run["files_modified"].append(file_path)
+            logger.info(f"[CodeAgent]   🔧 Patched: {file_path}")
+            
+            # Update memory: file modified
+            MemoryManager.update_file_context(
+                state,
+                file_path=file_path,
+                operation="modified",
+                agent="code_agent"
+            )
+            
+        else:
+            logger.info(f"[CodeAgent]   ⚠️  Unknown tool: {tool_name}")
+
+
+async def _stream_turn(run: dict):
+    """One throttled, streamed LLM turn for a step; tools start mid-stream."""
+    await llm_throttler.aacquire(estimate_tokens(run["messages"]))
+    return await stream_tool_calls(code_model, run["messages"], tool_map, agent="code_agent")
+
+
+async def _run_step(state: AgentState, run: dict) -> None:
+    """
+    Multi-iteration loop for ONE step. Steps of a group share `state`, but
+    every state update below is synchronous, so concurrent steps never
+    interleave inside one (they only switch at awaits).
+    """
+    max_iterations = 5  # Safety limit for this ONE step
+    
+    for iteration in range(max_iterations):
+        logger.debug(f"[CodeAgent] Step {run['step']} iteration {iteration + 1}/{max_iterations}")
+        
+        # Stream the turn; each tool call is dispatched as soon as its
+        # arguments are complete
+        response, flat_calls, results = await _stream_turn(run)
+        run["messages"].append(response)
+        run["iterations"] += 1
+        
+        # Check if LLM wants to use tools
+        if not response.tool_calls:
+            # No more tool calls - this step is complete
+            logger.info(f"[CodeAgent] Step {run['step']} execution complete")
+            break
+        
+        for tool_call in flat_calls:
+            logger.debug(f"[CodeAgent]   🔧 {tool_call['name']}({list(tool_call['args'].keys())})")
+        
+        _record_tool_results(state, run, flat_calls, results)
+        
+        # Earlier outputs shrink to digests; only this turn's go in full
+        digest_tool_messages(run["messages"])
+        
+        # Add tool results back to conversation (one message per LLM tool call)
+        for tool_id, content in group_tool_results(response.tool_calls, flat_calls, results):
+            run["messages"].append(
+                ToolMessage(
+                    content=content,
+                    tool_call_id=tool_id
+                )
+            )
+        
+        # Early exit: the LLM declared these calls final and they all worked
+        failed = any(
+            isinstance(result, Exception) or str(result).startswith("ERROR")
+            for result in results
+        )
+        if COMPLETION_SIGNAL in str(response.content or "") and not failed:
+            logger.info(f"[CodeAgent] Step {run['step']} execution complete (early exit)")
+            break
+
+
+async def _code_agent(state: AgentState) -> AgentState:
     """
     Code Agent - Executes ONE step from the plan (WITH MEMORY)
     
@@ -29,234 +202,117 @@ def CodeAgent(state: AgentState) -> AgentState:
     
     Internal loop: Allows multiple tool calls within one step
     External loop: Context Agent controls step progression
+    
+    When the Context Agent hands over a group of independent steps
+    (state["step_group"]), each step keeps its own conversation and runs
+    its own loop concurrently with the others, all in this one graph hop.
+    Tool calls start executing as soon as their arguments have streamed in.
     """
     
     # Initialize memory system
     state = MemoryManager.initialize_memory(state)
     
-    current_task = state.get("current_task", "")
-    target_file = state.get("target_file", "")
     current_step = state.get("current_step", 0)
-    
-    print(f"\n[CodeAgent] Starting work on Step {current_step}")
-    print(f"[CodeAgent] Task: {current_task[:80]}...")
+    step_group = state.get("step_group") or [current_step]
+    plan = state.get("plan", [])
     
     # Build context from memory for better understanding
     memory_context = MemoryManager.build_context_for_agent(state)
     
-    system_content = (
-        Code_Agent_Prompt
-        + "\n\n" + memory_context  # Include memory context
+    # The system prompt stays byte-identical across steps and iterations so the
+    # provider can serve it from its prompt cache; memory changes every step,
+    # so it goes in a separate message after the stable prefix
+    memory_content = (
+        memory_context
         + "\n\nUse the context above to understand file references and previous work."
     )
     
-    user_content = (
-        f"Current Step: {current_step}\n"
-        f"Task for THIS step: {current_task}\n"
-    )
-    if target_file:
-        user_content += f"Target file: {target_file}\n"
-    
-    user_content += "\nComplete THIS step using the available tools. When done, confirm completion."
+    # One run (conversation + file tracking) per step handled in this hop
+    runs = []
+    for step_index in step_group:
+        if len(step_group) > 1:
+            step = plan[step_index]
+            current_task = step.get("instruction", "")
+            target_file = step.get("target_file", "")
+        else:
+            current_task = state.get("current_task", "")
+            target_file = state.get("target_file", "")
+        
+        logger.info(f"\n[CodeAgent] Starting work on Step {step_index}")
+        logger.info(f"[CodeAgent] Task: {current_task[:80]}...")
+        
+        runs.append({
+            "step": step_index,
+            "messages": build_messages(CODE_AGENT_PROMPT, CODE_AGENT_SCENARIOS, [
+                HumanMessage(content=memory_content),
+                HumanMessage(content=code_agent_dynamic(step_index, current_task, target_file))
+            ]),
+            "files_created": [],
+            "files_modified": [],
+            "files_read": [],
+            "iterations": 0,
+        })
     
-    # Multi-iteration loop (within one step)
-    messages = [
-        SystemMessage(content=system_content),
-        HumanMessage(content=user_content)
-    ]
+    # Each step runs its own iteration loop; independent steps go concurrently
+    # so a quick step never waits on a slow one
+    await asyncio.gather(*(_run_step(state, run) for run in runs))
     
-    max_iterations = 5  # Safety limit for this ONE step
-    files_created = []
-    files_modified = []
-    files_read = []
+    # Recorded so the planner can see how many LLM turns steps really take
+    state["iterations_used"] = max(run["iterations"] for run in runs)
     
-    for iteration in range(max_iterations):
-        print(f"[CodeAgent] Iteration {iteration + 1}/{max_iterations}")
-        
-        # Get LLM response
-        response = code_model.invoke(messages)
-        messages.append(response)
-        
-        # Check if LLM wants to use tools
-        if not response.tool_calls:
-            # No more tool calls - this step is complete
-            print(f"[CodeAgent] Step {current_step} execution complete")
+    # A step counts as done once it created or modified something. Only the
+    # leading run of finished steps is reported, so current_step can advance.
+    completed_steps = []
+    for run in runs:
+        if not (run["files_created"] or run["files_modified"]):
             break
-        
-        # Execute each tool call
-        for tool_call in response.tool_calls:
-            tool_name = tool_call["name"]
-            tool_args = tool_call["args"]
-            tool_id = tool_call["id"]
-            
-            print(f"[CodeAgent]   🔧 {tool_name}({list(tool_args.keys())})")
-            
-            try:
-                # Execute the appropriate tool
-                if tool_name == "write_file":
-                    result = write_file.invoke(tool_args)
-                    file_path = tool_args.get("path", "unknown")
-                    
-                    # Determine if this is a new file or modification
-                    is_new_file = file_path not in state.get("generated_files", [])
-                    
-                    if is_new_file:
-                        files_created.append(file_path)
-                        print(f"[CodeAgent]   ✅ Created: {file_path}")
-                        
-                        # Update memory: file created
-                        MemoryManager.update_file_context(
-                            state,
-                            file_path=file_path,
-                            operation="created",
-                            agent="code_agent"
-                        )
-                    else:
-                        files_modified.append(file_path)
-                        print(f"[CodeAgent]   ✅ Modified: {file_path}")
-                        
-                        # Update memory: file modified
-                        MemoryManager.update_file_context(
-                            state,
-                            file_path=file_path,
-                            operation="modified",
-                            agent="code_agent"
-                        )
-                    
-                elif tool_name == "read_file":
-                    result = read_file.invoke(tool_args)
-                    file_path = tool_args.get("path", "unknown")
-                    files_read.append(file_path)
-                    print(f"[CodeAgent]   📖 Read: {file_path}")
-                    
-                    # Update memory: file read
-                    MemoryManager.update_file_context(
-                        state,
-                        file_path=file_path,
-                        operation="read",
-                        agent="code_agent"
-                    )
-                    
-                elif tool_name == "apply_patch":
-                    result = apply_patch.invoke(tool_args)
-                    file_path = tool_args.get("path", "unknown")
-                    files_modified.append(file_path)
-                    print(f"[CodeAgent]   🔧 Patched: {file_path}")
-                    
-                    # Update memory: file modified
-                    MemoryManager.update_file_context(
-                        state,
-                        file_path=file_path,
-                        operation="modified",
-                        agent="code_agent"
-                    )
-                    
-                else:
-                    result = f"Unknown tool: {tool_name}"
-                    print(f"[CodeAgent]   ⚠️  Unknown tool: {tool_name}")
-                
-                # Add tool result back to conversation
-                messages.append(
-                    ToolMessage(
-                        content=str(result),
-                        tool_call_id=tool_id
-                    )
-                )
-                
-            except Exception as e:
-                error_msg = f"Error: {str(e)}"
-                print(f"[CodeAgent]   ❌ {tool_name} failed: {e}")
-                messages.append(
-                    ToolMessage(
-                        content=error_msg,
-                        tool_call_id=tool_id
-                    )
-                )
+        completed_steps.append(run["step"])
     
-    # ===== FIXED CODE: Read file contents with correct paths =====
-    # Update state with results from THIS step
+    # Unique paths in first-touch order; a file created this hop and then
+    # patched again is reported once, as created
+    files_created = list(dict.fromkeys(f for run in runs for f in run["files_created"]))
+    files_modified = [
+        f for f in dict.fromkeys(f for run in runs for f in run["files_modified"])
+        if f not in files_created
+    ]
+    files_read = list(dict.fromkeys(f for run in runs for f in run["files_read"]))
+    
+    # Record every file written this hop, even when the leading step failed
+    # and later steps of the group did not: those files exist on disk and must
+    # not vanish from generated_files / file_contents. file_contents was
+    # mostly filled from the write_file / apply_patch payloads already.
     if files_created or files_modified:
-        # Initialize file_contents if it doesn't exist
         if "file_contents" not in state:
             state["file_contents"] = {}
         
         generated = state.get("generated_files", [])
         
-        # Get the project path from state (absolute path passed by VS Code)
-        project_path = os.getcwd()
-        
-        print(f"[CodeAgent]   📂 Project path: {project_path}")
-        print(f"[CodeAgent]   📂 Current working directory: {os.getcwd()}")
-        
-        # Process newly created files
-        for file_path in files_created:
+        # Contents normally came from the tool payloads; anything missing is
+        # read from disk. The extension writes file_contents back to disk, so
+        # a file that can't be read is left out rather than given a stand-in.
+        captured = []
+        for file_path in files_created + files_modified:
             if file_path not in generated:
                 generated.append(file_path)
-            
-            # Build the absolute path
-            if os.path.isabs(file_path):
-                abs_path = file_path
-            else:
-                abs_path = os.path.join(project_path, file_path)
-            
-            print(f"[CodeAgent]   🔍 Attempting to read: {file_path}")
-            print(f"[CodeAgent]   📁 Absolute path: {abs_path}")
-            print(f"[CodeAgent]   ✓ File exists? {os.path.exists(abs_path)}")
-            
-            # Read and store file contents
-            try:
-                with open(abs_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    state["file_contents"][file_path] = content
-                    print(f"[CodeAgent]   ✅ Successfully read {len(content)} characters from {file_path}")
-            except Exception as e:
-                print(f"[CodeAgent]   ❌ ERROR reading {abs_path}")
-                print(f"[CodeAgent]   ❌ Error type: {type(e).__name__}")
-                print(f"[CodeAgent]   ❌ Error message: {e}")
-                
-                # Debug: List files in project directory
+            content = state["file_contents"].get(file_path)
+            if content is None:
                 try:
-                    files_in_dir = os.listdir(project_path)
-                    print(f"[CodeAgent]   📁 Files in project directory: {files_in_dir}")
-                except:
-                    pass
-                
-                state["file_contents"][file_path] = f"Error reading file: {e}"
+                    content = state["file_contents"][file_path] = read_text_cached(file_path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"[CodeAgent]   ⚠️  Could not read {file_path}: {e}")
+                    continue
+            captured.append(f"{file_path} ({len(content)} chars)")
         
-        # Process modified files
-        for file_path in files_modified:
-            if file_path not in generated:
-                generated.append(file_path)
-            
-            # Build the absolute path
-            if os.path.isabs(file_path):
-                abs_path = file_path
-            else:
-                abs_path = os.path.join(project_path, file_path)
-            
-            print(f"[CodeAgent]   🔍 Attempting to read modified file: {file_path}")
-            print(f"[CodeAgent]   📁 Absolute path: {abs_path}")
-            
-            # Read and store updated file contents
-            try:
-                with open(abs_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    state["file_contents"][file_path] = content
-                    print(f"[CodeAgent]   ✅ Successfully read updated contents ({len(content)} chars)")
-            except Exception as e:
-                print(f"[CodeAgent]   ❌ ERROR reading {abs_path}: {e}")
-                state["file_contents"][file_path] = f"Error reading file: {e}"
+        logger.info(f"[CodeAgent]   📄 Captured: {', '.join(captured)}")
         
         state["generated_files"] = generated
-        # ===== END FIXED CODE =====
         
-        print(f"[CodeAgent] ✅ Step {current_step} complete!")
         if files_created:
-            print(f"[CodeAgent]   Created: {files_created}")
+            logger.info(f"[CodeAgent]   Created: {files_created}")
         if files_modified:
-            print(f"[CodeAgent]   Modified: {files_modified}")
+            logger.info(f"[CodeAgent]   Modified: {files_modified}")
         if files_read:
-            print(f"[CodeAgent]   Read: {files_read}")
+            logger.info(f"[CodeAgent]   Read: {files_read}")
         
         # Add to conversation memory
         all_files = list(set(files_created + files_modified))
@@ -272,17 +328,21 @@ def CodeAgent(state: AgentState) -> AgentState:
             content=f"Code agent {' and '.join(operation_summary)}",
             files_mentioned=all_files
         )
+    
+    if completed_steps:
+        logger.info(f"[CodeAgent] ✅ Step {', '.join(map(str, completed_steps))} complete!")
         
+        state["step_group"] = completed_steps
         state["worker_completed"] = True
         
     else:
-        print(f"[CodeAgent] ❌ Step {current_step} failed - no files created/modified")
+        logger.info(f"[CodeAgent] ❌ Step {current_step} failed - it created/modified no files")
         
         # Add failure to conversation memory
         MemoryManager.add_conversation_turn(
             state,
             role="assistant",
-            content="Code agent attempted task but no files were created or modified",
+            content=f"Code agent attempted step {current_step} but it created or modified no files",
             files_mentioned=[]
         )
         
@@ -1,25 +1,188 @@
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
 import os
 import json
 import re
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
 
 from workflow_State.main_state import AgentState
-from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
-from prompts.prompts_list import Context_Agent_Prompt
-from workflow_tools.filesystemtools import list_files, read_file, search_text
+from langchain_core.messages import HumanMessage, ToolMessage
+from prompts.prompts_list import (
+    CONTEXT_AGENT_EXAMPLES,
+    CONTEXT_AGENT_PROMPT,
+    build_messages,
+    context_agent_dynamic,
+    pick_pattern,
+    planner_cache_key,
+)
+from workflow_tools.filesystemtools import get_project_root, list_files, read_file, search_text, batch
 from workflow_State.memory_manager import MemoryManager  # NEW
+from shared.agent_logging import flush_logs, get_logger
+from shared.llm_client import get_chat_model
+from shared.llm_throttler import llm_throttler
+from workflow_tools.parallel_tools import (
+    execute_tool_calls,
+    flatten_batch_calls,
+    group_tool_results,
+    run_sync,
+)
+
+logger = get_logger("agent.context")
+
+# Read-only exploration tools, callable directly or inside a batch call
+tool_map = {t.name: t for t in [list_files, read_file, search_text]}
+tools = [*tool_map.values(), batch]
+model = get_chat_model()
+
+# Structured output: the final (non tool-call) answer must be a plan object,
+# so it arrives as valid JSON instead of being fished out of free text
+PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "execution_plan",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "plan": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "agent": {
+                                "type": "string",
+                                "enum": ["code_agent", "debug_agent", "document_agent"],
+                            },
+                            "instruction": {"type": "string"},
+                            "target_file": {"type": ["string", "null"]},
+                        },
+                        "required": ["agent", "instruction", "target_file"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["plan"],
+            "additionalProperties": False,
+        },
+    },
+}
+model_with_tools = model.bind_tools(tools, response_format=PLAN_RESPONSE_FORMAT)
+
+
+# Upper bound on independent steps handed to the Code Agent in one hop
+MAX_PARALLEL_STEPS = int(os.getenv("MAX_PARALLEL_STEPS", "4"))
 
-load_dotenv()
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+# Short follow-ups on a known file skip the planning LLM entirely
+FAST_PATH_MAX_WORDS = 20
 
-tools = [list_files, read_file, search_text]
-model = ChatOpenAI(model="gpt-4o-mini")
-model_with_tools = model.bind_tools(tools)
+# Requests the planner must route through debug_agent first
+_DEBUG_KEYWORDS = re.compile(r"\b(error|bug|fix|crash|exception|traceback)", re.IGNORECASE)
+
+# Wording that suggests a step builds on the output of an earlier one
+_DEPENDENCY_HINTS = re.compile(r"\b(based on|previous|above|analysis|step \d+)\b", re.IGNORECASE)
+
+
+# Plans produced by the LLM, reused when the same request comes in again.
+# Keyed by planner_cache_key (project root and memory context included). Each
+# entry also records a fingerprint of the files the plan was based on, and is
+# only reused while they are unchanged and for at most PLANNER_CACHE_TTL seconds.
+PLANNER_CACHE_TTL = int(os.getenv("PLANNER_CACHE_TTL", "3600"))
+PLANNER_CACHE_SIZE = 128
+_plan_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+
+def _project_fingerprint(paths) -> tuple:
+    """
+    (path, mtime_ns, size) for each project path, None for missing ones. The
+    project root itself is always included: its mtime changes whenever a
+    top-level entry is added or removed.
+    """
+    project_root = get_project_root()
+    fingerprint = []
+    for path in sorted({".", *paths}):
+        try:
+            stat = os.stat(project_root / path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except (OSError, ValueError):
+            fingerprint.append((path, None))
+    return tuple(fingerprint)
+
+
+def _cached_plan(key: str):
+    with _plan_cache_lock:
+        entry = _plan_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, plan, paths, fingerprint = entry
+        if time.monotonic() - stored_at > PLANNER_CACHE_TTL:
+            del _plan_cache[key]
+            return None
+        _plan_cache.move_to_end(key)
+    # Stat outside the lock; a changed project invalidates the plan
+    if _project_fingerprint(paths) != fingerprint:
+        with _plan_cache_lock:
+            _plan_cache.pop(key, None)
+        return None
+    return [dict(step) for step in plan]
+
+
+def _store_plan(key: str, plan: list, paths: set) -> None:
+    entry = (time.monotonic(), [dict(step) for step in plan], frozenset(paths), _project_fingerprint(paths))
+    with _plan_cache_lock:
+        _plan_cache[key] = entry
+        if len(_plan_cache) > PLANNER_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+
+
+def _independent_step_group(plan: list, start: int) -> list:
+    """
+    Return the plan indices, beginning at `start`, that can run together:
+    consecutive code_agent steps with distinct target files whose instructions
+    don't mention each other's files or refer back to earlier output.
+    Dependency chains fall back to a single-step group.
+    """
+    group = [start]
+    first = plan[start]
+    if first.get("agent", "code_agent") != "code_agent" or not first.get("target_file"):
+        return group
+    
+    targets = [first["target_file"]]
+    for i in range(start + 1, min(len(plan), start + MAX_PARALLEL_STEPS)):
+        step = plan[i]
+        target = step.get("target_file")
+        instruction = step.get("instruction", "")
+        
+        if step.get("agent", "code_agent") != "code_agent" or not target or target in targets:
+            break
+        if _DEPENDENCY_HINTS.search(instruction):
+            break
+        if any(os.path.basename(t) in instruction for t in targets):
+            break
+        if any(os.path.basename(target) in plan[j].get("instruction", "") for j in group):
+            break
+        
+        group.append(i)
+        targets.append(target)
+    
+    return group
+
+
+def _parse_plan(text: str) -> dict:
+    """Decode the structured plan response; free-text JSON is the legacy fallback"""
+    if not text:
+        return {}
+    try:
+        payload = orjson.loads(text)
+        return payload if isinstance(payload, dict) else {}
+    except orjson.JSONDecodeError:
+        return _extract_json(text)
 
 
 def _extract_json(text: str) -> dict:
-    """Extract JSON object from text response"""
+    """Extract JSON object from text response (legacy, for non-structured replies)"""
     if not text:
         return {}
     m = re.search(r"\{.*\}", text, re.DOTALL)
@@ -61,7 +224,7 @@ def context_agent(state: AgentState) -> AgentState:
     # ============================================================
     resolved_file = MemoryManager.resolve_reference(state, user_request)
     if resolved_file:
-        print(f"[ContextAgent] 🧠 Memory resolved reference to: {resolved_file}")
+        logger.info(f"[ContextAgent] 🧠 Memory resolved reference to: {resolved_file}")
         state["target_file"] = resolved_file
         
         # Update user request to be more explicit
@@ -78,16 +241,46 @@ def context_agent(state: AgentState) -> AgentState:
         files_mentioned=[resolved_file] if resolved_file else []
     )
     
+    # ============================================================
+    # FAST PATH: trivial single-step follow-up on a resolved file
+    # ============================================================
+    if (
+        not state["plan"]
+        and resolved_file
+        and len(user_request.split()) < FAST_PATH_MAX_WORDS
+        and not _DEBUG_KEYWORDS.search(user_request)
+    ):
+        logger.info(f"[ContextAgent] ⚡ Simple request on {resolved_file} - single-step plan, no planning call")
+        state["plan"] = [{
+            "agent": "code_agent",
+            "instruction": user_request,
+            "target_file": resolved_file
+        }]
+    
     # ============================================================
     # STEP 1: Create execution plan (with memory context)
     # ============================================================
+    plan_key = None
+    if not state["plan"] and PLANNER_CACHE_TTL > 0:
+        plan_key = planner_cache_key(
+            user_request,
+            resolved_file or "",
+            project_root=str(get_project_root()),
+            memory=MemoryManager.build_context_for_agent(state),
+        )
+        cached = _cached_plan(plan_key)
+        if cached:
+            logger.info(f"[ContextAgent] ♻️  Reusing cached plan ({len(cached)} steps) - no planning call")
+            state["plan"] = cached
+    
     if not state["plan"]:
         # Build context from memory
         memory_context = MemoryManager.build_context_for_agent(state)
         
-        system_content = (
-            Context_Agent_Prompt
-            + "\n\n" + memory_context  # Include memory!
+        # Stable system prompt first (prompt-cache friendly); memory and the
+        # request change every run, so they follow as a separate message
+        planning_content = (
+            memory_context  # Include memory!
             + "\n\n=== CURRENT PLANNING TASK ===\n"
             f"User request: {user_request}\n\n"
             "Create a detailed execution plan.\n"
@@ -96,59 +289,56 @@ def context_agent(state: AgentState) -> AgentState:
         )
         
         # ... rest of planning logic stays the same ...
-        messages = [
-            SystemMessage(content=system_content),
-            HumanMessage(content=f"User request:\n{user_request}\n\nCreate plan.")
-        ]
+        messages = build_messages(CONTEXT_AGENT_PROMPT, CONTEXT_AGENT_EXAMPLES[pick_pattern(user_request)], [
+            HumanMessage(content=planning_content),
+            HumanMessage(content=context_agent_dynamic(user_request))
+        ])
         
         max_iterations = 5
         plan = None
+        # Project paths the plan is based on, for the plan cache's fingerprint
+        explored_paths = {resolved_file} if resolved_file else set()
         
-        print(f"[ContextAgent] 🤔 Creating execution plan with memory context...")
+        logger.info(f"[ContextAgent] 🤔 Creating execution plan with memory context...")
         
         for iteration in range(max_iterations):
-            response = model_with_tools.invoke(messages)
+            response = llm_throttler.invoke(model_with_tools, messages)
             messages.append(response)
             
             if not response.tool_calls:
                 content = getattr(response, "content", "")
-                payload = _extract_json(content)
+                payload = _parse_plan(content)
                 plan = payload.get("plan", [])
                 
                 if plan:
-                    print(f"[ContextAgent] ✅ Plan created with {len(plan)} steps")
+                    logger.info(f"[ContextAgent] ✅ Plan created with {len(plan)} steps")
+                    if plan_key is not None:
+                        _store_plan(plan_key, plan, explored_paths)
                     break
                 else:
-                    print("[ContextAgent] ⚠️  No valid plan found, using fallback")
+                    logger.info("[ContextAgent] ⚠️  No valid plan found, using fallback")
                     break
             
-            for tool_call in response.tool_calls:
-                tool_name = tool_call["name"]
-                tool_args = tool_call["args"]
-                tool_id = tool_call["id"]
-                
-                print(f"[ContextAgent] 🔍 LLM exploring: {tool_name}")
-                
-                try:
-                    if tool_name == "list_files":
-                        result = list_files.invoke(tool_args)
-                    elif tool_name == "read_file":
-                        result = read_file.invoke(tool_args)
-                    elif tool_name == "search_text":
-                        result = search_text.invoke(tool_args)
-                    else:
-                        result = f"Unknown tool: {tool_name}"
-                    
-                    messages.append(ToolMessage(content=str(result), tool_call_id=tool_id))
-                    
-                except Exception as e:
-                    error_msg = f"Error: {str(e)}"
-                    print(f"[ContextAgent] ❌ {error_msg}")
-                    messages.append(ToolMessage(content=error_msg, tool_call_id=tool_id))
+            flat_calls = flatten_batch_calls(response.tool_calls)
+            for tool_call in flat_calls:
+                logger.info(f"[ContextAgent] 🔍 LLM exploring: {tool_call['name']}")
+                explored = tool_call["args"].get("path") or tool_call["args"].get("relative_dir")
+                if isinstance(explored, str):
+                    explored_paths.add(explored)
+            
+            # Exploration calls are independent - run them as one parallel group
+            results = run_sync(execute_tool_calls(flat_calls, tool_map))
+            
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.info(f"[ContextAgent] ❌ Error: {str(result)}")
+            
+            for tool_id, content in group_tool_results(response.tool_calls, flat_calls, results):
+                messages.append(ToolMessage(content=content, tool_call_id=tool_id))
         
         # Fallback
         if not plan:
-            print("[ContextAgent] Using fallback plan")
+            logger.info("[ContextAgent] Using fallback plan")
             
             # Smart fallback uses memory
             target = resolved_file or "output.py"
@@ -162,16 +352,16 @@ def context_agent(state: AgentState) -> AgentState:
         state["plan"] = plan
         
         # Display plan
-        print(f"\n[ContextAgent] 📋 Execution Plan ({len(plan)} steps):")
-        print("=" * 70)
+        logger.info(f"\n[ContextAgent] 📋 Execution Plan ({len(plan)} steps):")
+        logger.info("=" * 70)
         for i, step in enumerate(plan):
             agent = step.get('agent', 'unknown')
             target = step.get('target_file', 'N/A')
             instruction = step.get('instruction', '')
             display_instruction = instruction[:60] + "..." if len(instruction) > 60 else instruction
-            print(f"  Step {i}: [{agent}] → {target}")
-            print(f"           {display_instruction}")
-        print("=" * 70 + "\n")
+            logger.info(f"  Step {i}: [{agent}] → {target}")
+            logger.info(f"           {display_instruction}")
+        logger.info("=" * 70 + "\n")
     
     # ============================================================
     # STEP 2: Check if worker just completed a step
@@ -180,16 +370,18 @@ def context_agent(state: AgentState) -> AgentState:
     worker_completed = state.get("worker_completed", False)
     
     if worker_completed:
-        print(f"[ContextAgent] ✅ Step {current_step} completed")
+        logger.info(f"[ContextAgent] ✅ Step {current_step} completed")
         
         # Clear worker_completed flag
         state["worker_completed"] = False
         
-        # Advance to next step
-        state["current_step"] += 1
+        # Advance past every step the worker finished (more than one when
+        # independent steps were dispatched together)
+        finished = state.get("step_group") or [current_step]
+        state["current_step"] += len(finished)
         current_step = state["current_step"]
         
-        print(f"[ContextAgent] Moving to step {current_step}")
+        logger.info(f"[ContextAgent] Moving to step {current_step}")
     
     # ============================================================
     # STEP 3: Check if ALL steps complete → Trigger Review
@@ -199,11 +391,11 @@ def context_agent(state: AgentState) -> AgentState:
     if current_step >= len(plan):
         generated_files = state.get("generated_files", [])
         
-        print(f"\n[ContextAgent] 🎉 All {len(plan)} steps complete!")
+        logger.info(f"\n[ContextAgent] 🎉 All {len(plan)} steps complete!")
         if generated_files:
-            print(f"[ContextAgent] 📁 Files: {', '.join(generated_files)}")
+            logger.info(f"[ContextAgent] 📁 Files: {', '.join(generated_files)}")
         
-        print(f"[ContextAgent] → Triggering review...")
+        logger.info(f"[ContextAgent] → Triggering review...")
         
         # Add to conversation memory
         MemoryManager.add_conversation_turn(
@@ -218,6 +410,7 @@ def context_agent(state: AgentState) -> AgentState:
         state["active_agent"] = "reviewer_agent"
         state["done"] = False
         
+        flush_logs()
         return state
     
     # ============================================================
@@ -229,15 +422,23 @@ def context_agent(state: AgentState) -> AgentState:
     instruction = step.get("instruction", "")
     target_file = step.get("target_file", "")
     
+    # Independent code steps go out together so their LLM calls can be batched
+    step_group = _independent_step_group(plan, current_step)
+    
     state["current_task"] = instruction
     state["target_file"] = target_file
+    state["step_group"] = step_group
     state["done"] = False
     state["next_node"] = agent
     state["active_agent"] = agent
     
-    print(f"\n[ContextAgent] → Step {current_step}: Dispatching to {agent}")
-    print(f"  Instruction: {instruction[:80]}...")
+    if len(step_group) > 1:
+        logger.info(f"\n[ContextAgent] → Steps {step_group[0]}-{step_group[-1]}: "
+              f"Dispatching {len(step_group)} independent steps to {agent}")
+    logger.info(f"\n[ContextAgent] → Step {current_step}: Dispatching to {agent}")
+    logger.info(f"  Instruction: {instruction[:80]}...")
     if target_file:
-        print(f"  Target: {target_file}")
+        logger.info(f"  Target: {target_file}")
     
-    return state
\ No newline at end of file
+    flush_logs()
+    return state
@@ -1,124 +1,193 @@
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
+import hashlib
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 
 from workflow_State.main_state import AgentState
-from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
-from prompts.prompts_list import Debug_Agent_Prompt
-from workflow_tools.filesystemtools import read_file
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from prompts.prompts_list import (
+    DEBUG_AGENT_PROMPT,
+    DEBUG_AGENT_PROMPT_VERSION,
+    DEBUG_AGENT_SCENARIOS,
+    build_messages,
+    debug_agent_dynamic,
+)
+from workflow_tools.filesystemtools import get_project_root, read_file, read_text_cached, batch
+from shared.agent_logging import flush_logs, get_logger
+from shared.llm_client import get_chat_model
+from shared.llm_throttler import llm_throttler
+from workflow_tools.parallel_tools import (
+    execute_tool_calls,
+    flatten_batch_calls,
+    group_tool_results,
+    run_sync,
+)
 
-load_dotenv()
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+logger = get_logger("agent.debug")
 
-# Base model + read-only tool for debugging
-model = ChatOpenAI(model="gpt-4o-mini")
-tools = [read_file]
+# Base model + read-only tool for debugging (batch may only wrap read_file)
+model = get_chat_model()
+tool_map = {read_file.name: read_file}
+tools = [read_file, batch]
 debug_model = model.bind_tools(tools)
 
+# Python traceback frames: File "path/to/file.py", line 12
+_TRACEBACK_FILE = re.compile(r'File "([^"]+)", line \d+')
+MAX_PREFETCH_FILES = 4
 
-def DebugAgent(state: AgentState) -> AgentState:
+# Analyses of recently seen errors, keyed by the prompt version, the project,
+# the task, the target file's content and the normalized error signature, so
+# the same bug reported again with shifted line numbers reuses one LLM
+# analysis - but an analysis is never replayed once the code it looked at has
+# changed. Only finished analyses are cached, and only for a short while.
+DEBUG_CACHE_TTL = int(os.getenv("DEBUG_CACHE_TTL", "600"))
+DEBUG_CACHE_SIZE = 128
+_analysis_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_analysis_cache_lock = threading.Lock()
+
+_LINE_NUMBER = re.compile(r"\bline \d+")
+_HEX_ADDRESS = re.compile(r"0x[0-9a-fA-F]+")
+_QUOTED_PATH = re.compile(r'"(?:[^"]*[/\\])?([^"/\\]+)"')
+
+
+def debug_normalize(error_message: str, stack_trace: str) -> str:
     """
-    Debug Agent - Analyzes errors and suggests fixes (does NOT modify code)
-    
-    Responsibilities:
-    1. Analyze error messages and stack traces
-    2. Use read_file to examine problematic code
-    3. Identify root cause
-    4. Provide detailed fix suggestions for code_agent
-    5. Set worker_completed=True when analysis is done
-    6. Return to context_agent
-    
-    The code_agent will implement the suggested fixes in a subsequent step.
+    Reduce an error to its signature: line numbers, memory addresses and
+    directory parts of quoted paths are dropped, whitespace is collapsed.
     """
-    
-    current_task = state.get("current_task", "")
-    target_file = state.get("target_file", "")
-    error_message = state.get("error_message", "")
-    stack_trace = state.get("stack_trace", "")
-    current_step = state.get("current_step", 0)
-    
-    print(f"\n[DebugAgent] Starting analysis for Step {current_step}")
-    print(f"[DebugAgent] Task: {current_task[:80]}...")
-    
-    # Build system prompt
-    system_content = (
-        Debug_Agent_Prompt
+    text = f"{error_message or ''}\n{stack_trace or ''}"
+    text = _LINE_NUMBER.sub("line N", text)
+    text = _HEX_ADDRESS.sub("0xADDR", text)
+    text = _QUOTED_PATH.sub(r'"\1"', text)
+    return " ".join(text.split())
+
+
+def _debug_cache_key(target_file: str, current_task: str, error_message: str, stack_trace: str):
+    if DEBUG_CACHE_TTL <= 0 or not (error_message or stack_trace):
+        return None
+    try:
+        content = read_text_cached(target_file) if target_file else ""
+    except OSError:
+        content = ""
+    fingerprint = hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+    return (
+        DEBUG_AGENT_PROMPT_VERSION,
+        str(get_project_root()),
+        current_task or "",
+        os.path.normpath(target_file or ""),
+        fingerprint,
+        debug_normalize(error_message, stack_trace),
     )
+
+
+def _cached_analysis(key: tuple):
+    with _analysis_cache_lock:
+        entry = _analysis_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, analysis = entry
+        if time.monotonic() - stored_at > DEBUG_CACHE_TTL:
+            del _analysis_cache[key]
+            return None
+        _analysis_cache.move_to_end(key)
+        return analysis
+
+
+def _store_analysis(key: tuple, analysis: str) -> None:
+    with _analysis_cache_lock:
+        _analysis_cache[key] = (time.monotonic(), analysis)
+        if len(_analysis_cache) > DEBUG_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
+
+def _prefetch_traceback_files(stack_trace: str) -> list:
+    """
+    Speculatively read the files named in a stack trace, all in parallel,
+    before the first LLM call. Returns (path, content) for the ones that
+    could be read; frames outside the project (stdlib, site-packages) fail
+    read_file's root check and are skipped.
+    """
+    paths = list(dict.fromkeys(_TRACEBACK_FILE.findall(stack_trace or "")))
+    paths = [p for p in paths if not p.startswith("<")][-MAX_PREFETCH_FILES:]
+    if not paths:
+        return []
     
-    # Build user content with debugging context
-    user_content_parts = [f"Debug Task: {current_task}"]
-    
-    if target_file:
-        user_content_parts.append(f"Target file: {target_file}")
-    
-    if error_message:
-        user_content_parts.append(f"\nError Message:\n{error_message}")
-    
-    if stack_trace:
-        user_content_parts.append(f"\nStack Trace:\n{stack_trace}")
+    calls = [{"name": read_file.name, "args": {"path": p}, "id": f"prefetch:{n}"} for n, p in enumerate(paths)]
+    results = run_sync(execute_tool_calls(calls, tool_map))
+    return [
+        (path, result) for path, result in zip(paths, results)
+        if isinstance(result, str) and not result.startswith("ERROR")
+    ]
+
+
+def _analyze(state: AgentState, current_task: str, target_file: str, error_message: str, stack_trace: str) -> tuple:
+    """
+    Run the LLM analysis loop. Returns (analysis text, files analyzed, whether
+    the LLM finished - i.e. the last message is an answer, not tool calls).
+    """
+    current_step = state.get("current_step", 0)
     
-    user_content_parts.append(
-        "\nAnalyze this error thoroughly using the read_file tool if needed, "
-        "then provide a detailed fix suggestion."
-    )
-    user_content = "\n".join(user_content_parts)
+    # Frozen system prompt first (cacheable prefix), per-error details after it
+    user_content = debug_agent_dynamic(current_task, target_file, error_message, stack_trace)
     
     # Analysis loop - LLM can read multiple files to understand context
-    messages = [
-        SystemMessage(content=system_content),
+    messages = build_messages(DEBUG_AGENT_PROMPT, DEBUG_AGENT_SCENARIOS, [
         HumanMessage(content=user_content)
-    ]
+    ])
     
     max_iterations = 5  # Allow reading multiple files for analysis
     files_analyzed = []
     
+    # Files from the stack trace are almost always needed - hand them over
+    # up front so the LLM can usually skip its own read_file round-trips
+    prefetched = _prefetch_traceback_files(stack_trace)
+    if prefetched:
+        logger.info(f"[DebugAgent]   📖 Prefetched from stack trace: {', '.join(p for p, _ in prefetched)}")
+        files_analyzed.extend(p for p, _ in prefetched)
+        messages.append(HumanMessage(content="Files from the stack trace (already read for you):\n\n" + "\n\n".join(
+            f"=== {path} ===\n{content}" for path, content in prefetched
+        )))
+    
     for iteration in range(max_iterations):
-        print(f"[DebugAgent] Analysis iteration {iteration + 1}/{max_iterations}")
+        logger.debug(f"[DebugAgent] Analysis iteration {iteration + 1}/{max_iterations}")
         
         # Get LLM response
-        response = debug_model.invoke(messages)
+        response = llm_throttler.invoke(debug_model, messages)
         messages.append(response)
+        state["iterations_used"] = iteration + 1
         
         # Check if LLM finished analysis (no more tool calls)
         if not response.tool_calls:
             # LLM provided final analysis
-            print(f"[DebugAgent] ✅ Analysis complete for Step {current_step}")
+            logger.info(f"[DebugAgent] ✅ Analysis complete for Step {current_step}")
             break
         
         # Execute tool calls (LLM is reading files to understand the error)
-        for tool_call in response.tool_calls:
+        flat_calls = flatten_batch_calls(response.tool_calls)
+        for tool_call in flat_calls:
+            logger.info(f"[DebugAgent]   📖 Reading: {tool_call['args'].get('path', 'unknown')}")
+        
+        results = run_sync(execute_tool_calls(flat_calls, tool_map))
+        
+        for tool_call, result in zip(flat_calls, results):
             tool_name = tool_call["name"]
-            tool_args = tool_call["args"]
-            tool_id = tool_call["id"]
-            
-            print(f"[DebugAgent]   📖 Reading: {tool_args.get('path', 'unknown')}")
-            
-            try:
-                if tool_name == "read_file":
-                    result = read_file.invoke(tool_args)
-                    file_path = tool_args.get("path", "unknown")
-                    files_analyzed.append(file_path)
-                else:
-                    result = f"Unknown tool: {tool_name}"
-                    print(f"[DebugAgent]   ⚠️  Unknown tool: {tool_name}")
-                
-                # Send result back to LLM
-                messages.append(
-                    ToolMessage(
-                        content=str(result),
-                        tool_call_id=tool_id
-                    )
-                )
-                
-            except Exception as e:
-                error_msg = f"Error reading file: {str(e)}"
-                print(f"[DebugAgent]   ❌ {error_msg}")
-                messages.append(
-                    ToolMessage(
-                        content=error_msg,
-                        tool_call_id=tool_id
-                    )
+            if isinstance(result, Exception):
+                logger.info(f"[DebugAgent]   ❌ Error reading file: {str(result)}")
+            elif tool_name == "read_file":
+                files_analyzed.append(tool_call["args"].get("path", "unknown"))
+            else:
+                logger.info(f"[DebugAgent]   ⚠️  Unknown tool: {tool_name}")
+        
+        # Send results back to LLM
+        for tool_id, content in group_tool_results(response.tool_calls, flat_calls, results):
+            messages.append(
+                ToolMessage(
+                    content=content,
+                    tool_call_id=tool_id
                 )
+            )
     
     # Extract the final analysis from LLM
     final_response = messages[-1] if messages else None
@@ -127,24 +196,65 @@ def DebugAgent(state: AgentState) -> AgentState:
     if final_response and hasattr(final_response, 'content'):
         analysis = final_response.content
     
+    finished = isinstance(final_response, AIMessage) and not final_response.tool_calls
+    return analysis, files_analyzed, finished
+
+
+def DebugAgent(state: AgentState) -> AgentState:
+    """
+    Debug Agent - Analyzes errors and suggests fixes (does NOT modify code)
+    
+    Responsibilities:
+    1. Analyze error messages and stack traces
+    2. Use read_file to examine problematic code
+    3. Identify root cause
+    4. Provide detailed fix suggestions for code_agent
+    5. Set worker_completed=True when analysis is done
+    6. Return to context_agent
+    
+    The code_agent will implement the suggested fixes in a subsequent step.
+    """
+    
+    current_task = state.get("current_task", "")
+    target_file = state.get("target_file", "")
+    error_message = state.get("error_message", "")
+    stack_trace = state.get("stack_trace", "")
+    current_step = state.get("current_step", 0)
+    
+    logger.info(f"\n[DebugAgent] Starting analysis for Step {current_step}")
+    logger.info(f"[DebugAgent] Task: {current_task[:80]}...")
+    
+    cache_key = _debug_cache_key(target_file, current_task, error_message, stack_trace)
+    analysis = _cached_analysis(cache_key) if cache_key else None
+    files_analyzed = []
+    
+    if analysis:
+        logger.info("[DebugAgent] ♻️  Same error signature analyzed recently - reusing that analysis")
+        state["iterations_used"] = 0
+    else:
+        analysis, files_analyzed, finished = _analyze(state, current_task, target_file, error_message, stack_trace)
+        # An analysis cut off mid-exploration is not worth replaying
+        if analysis and finished and cache_key:
+            _store_analysis(cache_key, analysis)
+    
     # Store analysis for code_agent to use
     if analysis:
         # Store in last_diff (or create a new field like debug_analysis)
         state["last_diff"] = f"=== DEBUG ANALYSIS ===\n\n{analysis}"
         
-        print(f"\n[DebugAgent] 📋 Analysis Summary:")
-        print("=" * 70)
+        logger.info(f"\n[DebugAgent] 📋 Analysis Summary:")
+        logger.info("=" * 70)
         # Show first 300 chars of analysis
-        print(analysis[:300] + ("..." if len(analysis) > 300 else ""))
-        print("=" * 70)
+        logger.info(analysis[:300] + ("..." if len(analysis) > 300 else ""))
+        logger.info("=" * 70)
         
         if files_analyzed:
-            print(f"[DebugAgent] Files analyzed: {', '.join(set(files_analyzed))}")
+            logger.info(f"[DebugAgent] Files analyzed: {', '.join(set(files_analyzed))}")
         
         # Signal successful completion
         state["worker_completed"] = True
     else:
-        print(f"[DebugAgent] ❌ Failed to generate analysis")
+        logger.info(f"[DebugAgent] ❌ Failed to generate analysis")
         state["last_diff"] = "Debug analysis failed - no suggestions available"
         state["worker_completed"] = False
     
@@ -152,4 +262,5 @@ def DebugAgent(state: AgentState) -> AgentState:
     state["next_node"] = "context_agent"
     state["done"] = False
     
-    return state
\ No newline at end of file
+    flush_logs()
+    return state
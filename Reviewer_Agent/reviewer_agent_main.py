@@ -1,19 +1,89 @@
 # reviewer_agent_main.py (Fixed - only interrupt once)
 
+import re
+
 from workflow_State.main_state import AgentState
 from langgraph.types import interrupt
+from shared.agent_logging import flush_logs, get_logger
+
+logger = get_logger("agent.reviewer")
+
+# Review feedback that means "approve": any of these phrases appearing as
+# whole words, in any case. Built once per process.
+APPROVAL_KEYWORDS = frozenset({'looks good', 'approve', 'approved', 'done', 'ok', 'good', 'lgtm', 'perfect'})
+_APPROVAL_RE = re.compile(
+    r"\b(?:%s)\b" % "|".join(sorted(map(re.escape, APPROVAL_KEYWORDS), key=len, reverse=True)),
+    re.IGNORECASE,
+)
+
+
+_BAR = "=" * 70
+
+# Fixed banners, formatted once; only the feedback text is interpolated
+_SKIPPED_BANNER = "\n%s\n⏭️  REVIEW SKIPPED (skip_review=True)\n%s" % (_BAR, _BAR)
+_RESUMED_BANNER = "\n%s\n▶️  Workflow RESUMED - processing user feedback...\n%s" % (_BAR, _BAR)
+
+
+def is_approval_feedback(feedback) -> bool:
+    """Empty feedback counts as approval."""
+    if not feedback or feedback.isspace():
+        return True
+    return _APPROVAL_RE.search(feedback) is not None
+
+
+def _render_summary(plan: list, generated_files: list) -> str:
+    """Build the review-required summary shown before the interrupt."""
+    lines = [
+        "",
+        _BAR,
+        "🎉 WORKFLOW PLAN COMPLETED - REVIEW REQUIRED",
+        _BAR,
+        "",
+        "📋 Completed Plan Summary:",
+        f"   Total steps executed: {len(plan)}",
+        "",
+        "📝 Steps completed:",
+    ]
+    for i, step in enumerate(plan):
+        agent = step.get('agent', 'unknown')
+        instruction = step.get('instruction', '')[:60]
+        target = step.get('target_file', 'N/A')
+        lines.append(f"   Step {i}: [{agent}] {target}")
+        lines.append(f"            {instruction}...")
+    
+    if generated_files:
+        lines.append("")
+        lines.append("📂 Files Created/Modified:")
+        lines.extend(f"   ✓ {file}" for file in generated_files)
+    
+    lines += [
+        "",
+        _BAR,
+        "💬 REVIEW FEEDBACK REQUIRED",
+        _BAR,
+        "",
+        "⏸️  Workflow INTERRUPTED - waiting for user review...",
+        "    (In production: user will review via VS Code extension)",
+        _BAR,
+    ]
+    return "\n".join(lines)
 
 
 def ReviewerAgent(state: AgentState) -> AgentState:
     """
     Reviewer Agent - Human-in-the-Loop Review (Checkpointing-based)
     """
-    
+    # Flush on the way out too when interrupt() stops the node
+    try:
+        return _review(state)
+    finally:
+        flush_logs()
+
+
+def _review(state: AgentState) -> AgentState:
     # ✅ Check if review should be skipped (for local testing)
     if state.get("skip_review", False):
-        print("\n" + "=" * 70)
-        print("⏭️  REVIEW SKIPPED (skip_review=True)")
-        print("=" * 70)
+        logger.info(_SKIPPED_BANNER)
         state["needs_review"] = False
         state["done"] = True
         state["next_node"] = "orchestrator"
@@ -23,54 +93,51 @@ def ReviewerAgent(state: AgentState) -> AgentState:
     # ✅ CHECK: Has user already provided feedback?
     # If yes, this is a RESUME - process feedback and continue
     # If no, this is FIRST TIME - interrupt and wait
+    # (LangGraph re-runs the node from the top on resume, so nothing about
+    # the review summary is computed before this check)
+    feedback = state.get("user_feedback")
     
-    if state.get("user_feedback") is not None:
+    if feedback is not None:
         # ============================================================
         # RESUMING AFTER USER PROVIDED FEEDBACK
         # ============================================================
-        print("\n" + "=" * 70)
-        print("▶️  Workflow RESUMED - processing user feedback...")
-        print("=" * 70)
-        
-        feedback = state.get("user_feedback", "")
-        print(f"\n✅ Received feedback: {feedback[:100] if feedback else '(empty - approved)'}")
+        logger.info(
+            "%s\n✅ Received feedback: %s",
+            _RESUMED_BANNER, feedback[:100] if feedback else '(empty - approved)'
+        )
         
         # Parse feedback
-        approval_keywords = ['looks good', 'approve', 'approved', 'done', 'ok', 'good', 'lgtm', 'perfect']
-        is_approval = (
-            not feedback or
-            feedback.lower() in approval_keywords or
-            any(keyword in feedback.lower() for keyword in approval_keywords)
-        )
+        is_approval = is_approval_feedback(feedback)
         
         if is_approval:
             # ============================================================
             # APPROVE - End workflow
             # ============================================================
-            print("\n✅ Work approved! Ending workflow...")
+            logger.info("\n✅ Work approved! Ending workflow...")
             
             state["done"] = True
             state["next_node"] = "orchestrator"
             state["needs_review"] = False
             state["user_feedback"] = None  # Clear feedback
-            state["final_summary"] = f"Workflow completed successfully. {len(state.get('generated_files', []))} files created/modified."
+            generated_files = state.get("generated_files") or []
+            state["final_summary"] = f"Workflow completed successfully. {len(generated_files)} files created/modified."
             
         else:
             # ============================================================
             # REQUEST CHANGES - Create new plan
             # ============================================================
-            print(f"\n🔄 Creating new plan based on feedback...")
-            print(f"Feedback: {feedback}")
-            
-            plan = state.get("plan", [])
+            logger.info("\n🔄 Creating new plan based on feedback...\nFeedback: %s", feedback)
             
             # Create new user request incorporating feedback
             original_request = state.get("user_request", "")
-            new_request = f"Previous work completed:\n"
-            for i, step in enumerate(plan):
-                new_request += f"- {step.get('instruction', '')} ({step.get('target_file', 'N/A')})\n"
-            new_request += f"\nUser feedback/changes requested:\n{feedback}\n"
-            new_request += f"\nOriginal request: {original_request}"
+            parts = ["Previous work completed:\n"]
+            parts.extend(
+                f"- {step.get('instruction', '')} ({step.get('target_file', 'N/A')})\n"
+                for step in state.get("plan") or []
+            )
+            parts.append(f"\nUser feedback/changes requested:\n{feedback}\n")
+            parts.append(f"\nOriginal request: {original_request}")
+            new_request = "".join(parts)
             
             # Reset for new plan
             state["plan"] = []
@@ -83,7 +150,7 @@ def ReviewerAgent(state: AgentState) -> AgentState:
             state["active_agent"] = "context_agent"
             state["done"] = False
             
-            print("✅ Returning to Context Agent to create revised plan...")
+            logger.info("✅ Returning to Context Agent to create revised plan...")
         
         return state
     
@@ -91,41 +158,14 @@ def ReviewerAgent(state: AgentState) -> AgentState:
     # FIRST TIME - NEED TO REQUEST REVIEW
     # ============================================================
     
-    plan = state.get("plan", [])
-    generated_files = state.get("generated_files", [])
-    
-    # Display comprehensive summary
-    print("\n" + "=" * 70)
-    print("🎉 WORKFLOW PLAN COMPLETED - REVIEW REQUIRED")
-    print("=" * 70)
-    
-    print(f"\n📋 Completed Plan Summary:")
-    print(f"   Total steps executed: {len(plan)}")
-    
-    print("\n📝 Steps completed:")
-    for i, step in enumerate(plan):
-        agent = step.get('agent', 'unknown')
-        instruction = step.get('instruction', '')[:60]
-        target = step.get('target_file', 'N/A')
-        print(f"   Step {i}: [{agent}] {target}")
-        print(f"            {instruction}...")
-    
-    if generated_files:
-        print(f"\n📂 Files Created/Modified:")
-        for file in generated_files:
-            print(f"   ✓ {file}")
-    
-    print("\n" + "=" * 70)
-    print("💬 REVIEW FEEDBACK REQUIRED")
-    print("=" * 70)
-    
     # ✅ Set flag and INTERRUPT workflow (pauses here until update_state)
     state["needs_review"] = True
     state["active_agent"] = "reviewer_agent"
     
-    print("\n⏸️  Workflow INTERRUPTED - waiting for user review...")
-    print("    (In production: user will review via VS Code extension)")
-    print("=" * 70)
+    # Display comprehensive summary (one record instead of a line per record)
+    plan = state.get("plan") or []
+    generated_files = state.get("generated_files") or []
+    logger.info(_render_summary(plan, generated_files))
     
     # ✅ This pauses the workflow and saves checkpoint
     # Execution stops here until workflow.update_state() is called
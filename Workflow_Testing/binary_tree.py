@@ -1,58 +1,122 @@
-class Node:
-    def __init__(self, key):
-        self.left = None
-        self.right = None
-        self.value = key
+from array import array
+
 
 class BinaryTree:
+    """
+    Binary search tree stored as parallel arrays (structure of arrays)
+    instead of one Node object per key: node i holds values[i] and its
+    children are left[i] / right[i], with -1 meaning no child. Node 0 is
+    the root. Keys may be any comparable type, so values is a list; the
+    child links are compact machine-int arrays.
+    """
     def __init__(self):
-        self.root = None
+        self.values = []
+        self.left = array('l')
+        self.right = array('l')
+
+    @property
+    def root(self):
+        """Index of the root node, or None for an empty tree."""
+        return 0 if self.values else None
+
+    def _new_node(self, key):
+        self.values.append(key)
+        self.left.append(-1)
+        self.right.append(-1)
+        return len(self.values) - 1
 
     def insert(self, key):
-        if self.root is None:
-            self.root = Node(key)
-        else:
-            self._insert_recursive(self.root, key)
-
-    def _insert_recursive(self, current_node, key):
-        if key < current_node.value:
-            if current_node.left is None:
-                current_node.left = Node(key)
-            else:
-                self._insert_recursive(current_node.left, key)
-        else:
-            if current_node.right is None:
-                current_node.right = Node(key)
+        if not self.values:
+            self._new_node(key)
+            return
+
+        values, left, right = self.values, self.left, self.right
+        i = 0
+        while True:
+            if key < values[i]:
+                if left[i] == -1:
+                    left[i] = self._new_node(key)
+                    return
+                i = left[i]
             else:
-                self._insert_recursive(current_node.right, key)
+                if right[i] == -1:
+                    right[i] = self._new_node(key)
+                    return
+                i = right[i]
 
     def search(self, key):
-        return self._search_recursive(self.root, key)
-
-    def _search_recursive(self, current_node, key):
-        if current_node is None:
-            return False
-        if key == current_node.value:
-            return True
-        elif key < current_node.value:
-            return self._search_recursive(current_node.left, key)
-        else:
-            return self._search_recursive(current_node.right, key)
+        values, left, right = self.values, self.left, self.right
+        i = 0 if values else -1
+        while i != -1:
+            value = values[i]
+            if key == value:
+                return True
+            i = left[i] if key < value else right[i]
+        return False
+
+    def _start(self, node):
+        if node is None:
+            node = self.root
+        return -1 if node is None else node
+
+    def __iter__(self):
+        return self.in_order()
+
+    def in_order(self, node=None):
+        """Yield values in sorted order, iteratively (no recursion limit)."""
+        values, left, right = self.values, self.left, self.right
+        stack = []
+        i = self._start(node)
+        while stack or i != -1:
+            while i != -1:
+                stack.append(i)
+                i = left[i]
+            i = stack.pop()
+            yield values[i]
+            i = right[i]
+
+    def pre_order(self, node=None):
+        """Yield values node-left-right."""
+        values, left, right = self.values, self.left, self.right
+        i = self._start(node)
+        stack = [i] if i != -1 else []
+        while stack:
+            i = stack.pop()
+            yield values[i]
+            if right[i] != -1:
+                stack.append(right[i])
+            if left[i] != -1:
+                stack.append(left[i])
+
+    def post_order(self, node=None):
+        """Yield values left-right-node (reversed right-first pre-order)."""
+        values, left, right = self.values, self.left, self.right
+        i = self._start(node)
+        stack = [i] if i != -1 else []
+        output = []
+        while stack:
+            i = stack.pop()
+            output.append(values[i])
+            if left[i] != -1:
+                stack.append(left[i])
+            if right[i] != -1:
+                stack.append(right[i])
+        yield from reversed(output)
 
     def in_order_traversal(self, node, visit):
-        if node:
-            self.in_order_traversal(node.left, visit)
-            visit(node.value)
-            self.in_order_traversal(node.right, visit)
+        if node is None:
+            return
+        for value in self.in_order(node):
+            visit(value)
 
     def pre_order_traversal(self, node, visit):
-        if node:
-            visit(node.value)
-            self.pre_order_traversal(node.left, visit)
-            self.pre_order_traversal(node.right, visit)
+        if node is None:
+            return
+        for value in self.pre_order(node):
+            visit(value)
 
     def post_order_traversal(self, node, visit):
-        if node:
-            self.post_order_traversal(node.left, visit)
-            self.post_order_traversal(node.right, visit)
-            visit(node.value)
+        if node is None:
+            return
+        for value in self.post_order(node):
+            visit(value)
@@ -12,6 +12,8 @@ class LinkedList:
     """
     def __init__(self):
         self.head = None  # Head of the list
+        self.tail = None  # Last node, so appends don't walk the list
+        self.size = 0  # Number of nodes
 
     def insert_node(self, data):
         """
@@ -19,32 +21,33 @@ class LinkedList:
         """
         new_node = Node(data)
         if not self.head:
-            self.head = new_node
-            return
-        last_node = self.head
-        while last_node.next:
-            last_node = last_node.next
-        last_node.next = new_node
+            self.head = self.tail = new_node
+        else:
+            self.tail.next = new_node
+            self.tail = new_node
+        self.size += 1
 
     def delete_node(self, key):
         """
         Delete the first node with the specified data.
+        A dummy node in front of head lets the head case share the single scan.
         """
-        temp = self.head
-        if temp is not None:
-            if temp.data == key:
-                self.head = temp.next  # Change head if the node to be deleted is head
-                temp = None  # Free memory
+        dummy = Node(None)
+        dummy.next = self.head
+        prev, current = dummy, self.head
+        while current is not None:
+            if current.data == key:
+                prev.next = current.next
+                self.head = dummy.next
+                if current is self.tail:
+                    self.tail = prev if prev is not dummy else None
+                self.size -= 1
                 return
-        while temp is not None:
-            if temp.data == key:
-                break
-            prev = temp
-            temp = temp.next
-        if temp == None:
-            return  # Key not found
-        prev.next = temp.next
-        temp = None  # Free memory
+            prev, current = current, current.next
+        # Key not found
+
+    def __len__(self):
+        return self.size
 
     def display_list(self):
         """
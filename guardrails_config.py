@@ -1,29 +1,45 @@
 # guardrails_config.py
 
-from guardrails import Guard
-from guardrails.hub import DetectPII, ToxicLanguage
+from functools import lru_cache
+import asyncio
 import logging
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Distinct texts remembered per guard; the same user_request or output is
+# often validated again by several nodes of one workflow run
+VALIDATION_CACHE_SIZE = 256
+
+# PII entity types checked on each side, built once per process
+INPUT_PII_ENTITIES = frozenset({"EMAIL_ADDRESS", "PHONE_NUMBER", "CREDIT_CARD", "SSN", "IP_ADDRESS"})
+OUTPUT_PII_ENTITIES = frozenset({"EMAIL_ADDRESS", "PHONE_NUMBER", "CREDIT_CARD", "SSN", "API_KEY", "PASSWORD"})
+
 class GuardrailsManager:
     """Manages all guardrails for the agentic workflow"""
     
     def __init__(self):
-        """Initialize guards"""
+        """Initialize guards (loads the PII / toxicity models)"""
+        # Imported here so importing this module stays cheap
+        from guardrails import Guard
+        from guardrails.hub import DetectPII, ToxicLanguage
+        
+        # Input and output use different on_fail policies (reject vs redact),
+        # and a validator's on_fail is fixed at construction, so there are two
+        # DetectPII instances - but they share one Presidio analyzer below
+        input_pii = DetectPII(pii_entities=sorted(INPUT_PII_ENTITIES), on_fail="exception")
+        output_pii = DetectPII(
+            pii_entities=sorted(OUTPUT_PII_ENTITIES),
+            on_fail="fix"  # Redact PII in output instead of failing
+        )
+        shared_analyzer = getattr(input_pii, "pii_analyzer", None)
+        if shared_analyzer is not None and hasattr(output_pii, "pii_analyzer"):
+            output_pii.pii_analyzer = shared_analyzer
         
         # Input Guard - validates user input
         self.input_guard = Guard().use_many(
-            DetectPII(
-                pii_entities=[
-                    "EMAIL_ADDRESS", 
-                    "PHONE_NUMBER", 
-                    "CREDIT_CARD",
-                    "SSN",
-                    "IP_ADDRESS"
-                ],
-                on_fail="exception"
-            ),
+            input_pii,
             ToxicLanguage(
                 threshold=0.5,
                 validation_method="sentence",
@@ -32,19 +48,16 @@ class GuardrailsManager:
         )
         
         # Output Guard - validates agent output
-        self.output_guard = Guard().use(
-            DetectPII(
-                pii_entities=[
-                    "EMAIL_ADDRESS",
-                    "PHONE_NUMBER", 
-                    "CREDIT_CARD",
-                    "SSN",
-                    "API_KEY",
-                    "PASSWORD"
-                ],
-                on_fail="fix"  # Redact PII in output instead of failing
-            )
-        )
+        self.output_guard = Guard().use(output_pii)
+        
+        # Per-instance result caches (results are immutable tuples)
+        self._validate_input_cached = lru_cache(maxsize=VALIDATION_CACHE_SIZE)(self._run_input_guard)
+        self._validate_output_cached = lru_cache(maxsize=VALIDATION_CACHE_SIZE)(self._run_output_guard)
+    
+    def clear_cache(self):
+        """Forget cached results, e.g. at the end of a workflow run"""
+        self._validate_input_cached.cache_clear()
+        self._validate_output_cached.cache_clear()
     
     def validate_input(self, text: str) -> tuple[bool, str, str]:
         """
@@ -53,6 +66,9 @@ class GuardrailsManager:
         Returns:
             (is_valid, validated_text, error_message)
         """
+        return self._validate_input_cached(text)
+    
+    def _run_input_guard(self, text: str) -> tuple[bool, str, str]:
         try:
             result = self.input_guard.validate(text)
             logger.info(f"✅ Input validation passed")
@@ -69,6 +85,9 @@ class GuardrailsManager:
         Returns:
             (is_valid, sanitized_text, error_message)
         """
+        return self._validate_output_cached(text)
+    
+    def _run_output_guard(self, text: str) -> tuple[bool, str, str]:
         try:
             result = self.output_guard.validate(text)
             logger.info(f"✅ Output validation passed")
@@ -79,6 +98,54 @@ class GuardrailsManager:
             # For output, we still return the text but log the issue
             return True, text, error_msg
 
+    
+    async def avalidate_input(self, text: str) -> tuple[bool, str, str]:
+        """validate_input on a worker thread, so the event loop keeps running"""
+        return await asyncio.to_thread(self.validate_input, text)
+    
+    async def avalidate_output(self, text: str) -> tuple[bool, str, str]:
+        """validate_output on a worker thread, so the event loop keeps running"""
+        return await asyncio.to_thread(self.validate_output, text)
+    
+    async def avalidate_both(self, input_text: str, output_text: str) -> tuple[tuple, tuple]:
+        """
+        Validate an input and an (independent) output concurrently.
+        
+        Returns:
+            (input_result, output_result), each shaped like validate_input/output
+        """
+        return tuple(await asyncio.gather(
+            self.avalidate_input(input_text),
+            self.avalidate_output(output_text)
+        ))
+
+
+# Set GUARDRAILS_WARM_START=true to build the manager at server boot
+GUARDRAILS_WARM_START = os.getenv("GUARDRAILS_WARM_START", "false").lower() == "true"
+
+# Global instance, built on first use so the model loads stay off the
+# import path (and never happen in runs that don't validate anything)
+_guardrails_manager = None
+_guardrails_manager_lock = threading.Lock()
+
+
+def get_guardrails_manager() -> GuardrailsManager:
+    """Return the shared GuardrailsManager, constructing it on first call"""
+    global _guardrails_manager
+    with _guardrails_manager_lock:
+        if _guardrails_manager is None:
+            _guardrails_manager = GuardrailsManager()
+        return _guardrails_manager
+
+
+def warm_up_guardrails() -> threading.Thread:
+    """Build the manager on a background thread so the caller isn't blocked"""
+    thread = threading.Thread(target=get_guardrails_manager, name="guardrails-warmup", daemon=True)
+    thread.start()
+    return thread
+
 
-# Global instance
-guardrails_manager = GuardrailsManager()
\ No newline at end of file
+def clear_guardrails_cache():
+    """Drop cached validation results (no-op if the manager was never built)"""
+    if _guardrails_manager is not None:
+        _guardrails_manager.clear_cache()
\ No newline at end of file
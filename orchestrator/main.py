@@ -1,31 +1,30 @@
-from dotenv import load_dotenv
-import os
-
 from workflow_State.main_state import AgentState
+from guardrails_config import clear_guardrails_cache
 from langchain_core.messages import HumanMessage
 
-load_dotenv()
-os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-
 
-def orchestrator(state: AgentState) -> AgentState:
+def orchestrator(state: AgentState) -> dict:
     """
     Orchestrator (Start/End only):
     - On first entry: ensure user_request exists and hand off to context_agent.
     - On completion: if context_agent marked done=True, keep done=True so router ends.
+
+    Pass-through node: it returns only the keys whose value actually changes
+    (often none), so LangGraph writes no channel updates for it instead of
+    re-writing the whole state.
     """
+    updates = {}
 
     # Ensure messages exists
     if "messages" not in state or state["messages"] is None:
-        state["messages"] = []
+        updates["messages"] = []
 
     # If this is a fresh run, capture the request
     if not state.get("user_request"):
-        if state.get("messages"):
-            last_msg = state["messages"][-1]
-            state["user_request"] = getattr(last_msg, "content", "") or ""
-        else:
-            state["user_request"] = ""
+        messages = state.get("messages")
+        user_request = (getattr(messages[-1], "content", "") or "") if messages else ""
+        if state.get("user_request") != user_request:
+            updates["user_request"] = user_request
 
     # If context agent says we're done, do nothing except keep done=True
     if state.get("done"):
@@ -34,12 +33,20 @@ def orchestrator(state: AgentState) -> AgentState:
             print(f"[Orchestrator] Workflow complete: {summary}")
         else:
             print("[Orchestrator] Workflow complete.")
-        return state
+        
+        # Run boundary: cached validation results aren't needed any more
+        clear_guardrails_cache()
+        return updates
 
     # Otherwise always hand off to Context Agent (controller)
-    state["next_node"] = "context_agent"   # optional, but keeps it explicit
-    state["active_agent"] = "context_agent"
-    state["done"] = False
+    handoff = {
+        "next_node": "context_agent",   # optional, but keeps it explicit
+        "active_agent": "context_agent",
+        "done": False,
+    }
+    for key, value in handoff.items():
+        if state.get(key) != value:
+            updates[key] = value
 
     print("[Orchestrator] Handing off to Context Agent...")
-    return state
+    return updates
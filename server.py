@@ -1,21 +1,52 @@
 # server.py (Complete with checkpointing support)
 import asyncio
+import hashlib
+import logging
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, Dict, Any
 import os
+import time
+import weakref
 from datetime import datetime
 import traceback
 
+import msgpack
+import orjson
+
+# Load .env before importing the workflow: several modules read their
+# settings (PROJECT_ROOT, rate limits, ...) from the environment at import
+from dotenv import load_dotenv
+load_dotenv()
+
 # Import your existing workflow
-from workflow_State.workflow_main import create_workflow, create_initial_state, run_workflow_with_tracing
+from workflow_State.workflow_main import create_workflow, create_initial_state, get_checkpointer, get_db_pool, run_workflow_with_tracing_async
 from workflow_State.main_state import AgentState
+from Reviewer_Agent.reviewer_agent_main import is_approval_feedback
+from workflow_tools.filesystemtools import project_root_var, resolve_project_root
+from workflow_tools.parallel_tools import llm_token_sink
+from guardrails_config import GUARDRAILS_WARM_START, warm_up_guardrails
+from prompts.prompts_list import PROMPTS_MANIFEST
+from shared.session_store import RedisSessionStore, SessionStore, create_session_store
+from shared.agent_logging import LOG_LEVEL, get_logger
 
 from collections import defaultdict
 from datetime import datetime, timedelta
 from fastapi import Request
 
+logger = get_logger("agent.server")
+
+# Read once: these don't change while the server runs
+LANGSMITH_TRACING = os.getenv("LANGCHAIN_TRACING_V2", "false")
+LANGSMITH_PROJECT = os.getenv("LANGCHAIN_PROJECT", "default")
+
+_BAR = "=" * 70
+
+# Include tracebacks in WebSocket error messages only when debugging
+DEBUG = LOG_LEVEL == "DEBUG"
+
 # Timeout configuration
 WORKFLOW_TIMEOUT_SECONDS = 300  # 5 minutes max per workflow
 
@@ -47,7 +78,7 @@ def check_rate_limit(client_ip: str) -> bool:
     # Add new request
     rate_limit_tracker[client_ip].append(now)
     return True
-app = FastAPI(title="Agentic IDE Backend API")
+app = FastAPI(title="Agentic IDE Backend API", default_response_class=ORJSONResponse)
 
 # Enable CORS for VS Code extension
 app.add_middleware(
@@ -58,17 +89,362 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory session storage
-active_sessions: Dict[str, Dict[str, Any]] = {}
+# Compiled once at startup and shared by every session; runs are kept apart
+# by the thread_id in each session's checkpointer config
+app.state.workflow_app = None
+
+
+@app.on_event("startup")
+def compile_workflow():
+    app.state.workflow_app = create_workflow()
+
+
+@app.on_event("startup")
+def warm_start():
+    # Optional: load the guardrails models in the background at boot
+    if GUARDRAILS_WARM_START:
+        warm_up_guardrails()
+
+
+# Session storage: Redis when REDIS_URL is set (shared by all workers),
+# otherwise in-memory, bounded so abandoned sessions don't accumulate.
+# Idle sessions expire after the TTL either way
+MAX_ACTIVE_SESSIONS = int(os.getenv("MAX_ACTIVE_SESSIONS", "1000"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+FINISHED_SESSION_GRACE_SECONDS = 300
+_FINISHED_STATUSES = ("completed", "timeout")
+
+# Strong references to fire-and-forget tasks (the loop only keeps weak ones)
+_background_tasks: set = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _delete_checkpoints(thread_id: str):
+    """
+    Drop a released session's checkpoints. The checkpointer is shared by every
+    session (an in-memory one would otherwise keep every thread forever), and
+    nothing can resume a thread once its session is gone.
+    """
+    try:
+        get_checkpointer().delete_thread(thread_id)
+    except Exception as e:
+        logger.warning("Could not delete checkpoints of %s: %s", thread_id, e)
+
+
+def _on_session_evicted(session_id: str, session: Dict[str, Any]):
+    _spawn(asyncio.to_thread(_delete_checkpoints, session["thread_id"]))
+
+
+async def _discard_session(session_id: str) -> bool:
+    """Remove a session and its checkpoints; False if there was no such session."""
+    session = await active_sessions.pop(session_id, None)
+    if session is None:
+        return False
+    await asyncio.to_thread(_delete_checkpoints, session["thread_id"])
+    return True
+
+
+async def _release_finished_session(session_id: str):
+    # Nothing resumes a finished session: keep it a few minutes for late file
+    # fetches / DELETE, then release it instead of waiting out the idle TTL
+    await asyncio.sleep(FINISHED_SESSION_GRACE_SECONDS)
+    await _discard_session(session_id)
+
+
+active_sessions = create_session_store(
+    maxsize=MAX_ACTIVE_SESSIONS, ttl=SESSION_TTL_SECONDS, on_evict=_on_session_evicted
+)
+
+# Admission control: at most MAX_CONCURRENT_RUNS workflow runs stream at once;
+# further WebSocket runs wait for a slot. A Condition rather than a Semaphore
+# so the limit can be changed at runtime (set_max_concurrent_runs)
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "8"))
+_run_slots = asyncio.Condition()
+_active_runs = 0
+
+
+async def _acquire_run_slot():
+    global _active_runs
+    async with _run_slots:
+        await _run_slots.wait_for(lambda: _active_runs < MAX_CONCURRENT_RUNS)
+        _active_runs += 1
+
+
+async def _release_run_slot():
+    global _active_runs
+    async with _run_slots:
+        _active_runs -= 1
+        _run_slots.notify_all()
+
+
+async def set_max_concurrent_runs(limit: int):
+    global MAX_CONCURRENT_RUNS
+    async with _run_slots:
+        MAX_CONCURRENT_RUNS = limit
+        _run_slots.notify_all()
+
+
+# Per-session locks serializing a session's WebSocket run and review updates.
+# Weak values: a lock disappears once nothing is waiting on or holding it
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+
+# Marks the end of a workflow stream in the step queue
+_STREAM_END = object()
+
+
+async def _produce_steps(workflow_stream, queue: asyncio.Queue):
+    """
+    Queue every state of the async workflow stream, then _STREAM_END - or the
+    exception the workflow raised.
+    """
+    try:
+        async for step_state in workflow_stream:
+            await queue.put(step_state)
+        await queue.put(_STREAM_END)
+    except Exception as e:
+        await queue.put(e)
+
+
+async def _watch_disconnect(websocket: WebSocket, producer: asyncio.Task, queue: asyncio.Queue):
+    """
+    Wait for the client to go away, then stop the workflow right away rather
+    than when the next send fails - with uvicorn's pings that is at most
+    WS_PING_INTERVAL + WS_PING_TIMEOUT seconds after the client died. The
+    extension never sends, so the only message this sees is the disconnect.
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            producer.cancel()
+            queue.put_nowait(WebSocketDisconnect(message.get("code", 1000)))
+            return
+
+
+async def _drain(queue: asyncio.Queue, linger: float = 0) -> list:
+    """
+    Wait for one item, then take every other item that is already queued.
+    With linger, also keep taking items that arrive within `linger` seconds
+    of the previous one (for at most 10 * linger in total).
+    """
+    items = [await queue.get()]
+    deadline = asyncio.get_running_loop().time() + 10 * linger
+    while True:
+        try:
+            items.append(queue.get_nowait())
+        except asyncio.QueueEmpty:
+            if not linger or asyncio.get_running_loop().time() >= deadline:
+                return items
+            try:
+                items.append(await asyncio.wait_for(queue.get(), linger))
+            except asyncio.TimeoutError:
+                return items
+
+
+_STEP_MESSAGE_TYPES = ("step_update", "step_patch")
+
+
+# How long the writer waits for more frames to join a burst before sending
+WS_COALESCE_SECONDS = float(os.getenv("WS_COALESCE_MS", "3")) / 1000
+
+# Frames queued per connection before pending step messages are collapsed
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "32"))
+
+
+async def _offer(outbox: asyncio.Queue, snapshot: Optional[Dict[str, Any]], message: Dict[str, Any]):
+    """
+    Queue a frame for the connection's writer. If the client has fallen so far
+    behind that the queue is full, the queued step messages are replaced by one
+    full step_update of the latest snapshot - the extension only needs the
+    newest state - and queued token frames are dropped, while
+    review_required / workflow_complete / error frames are kept in order.
+    The snapshot takes the place of the first dropped step message, so it
+    still precedes any terminal frame queued after it.
+    """
+    try:
+        outbox.put_nowait(message)
+        return
+    except asyncio.QueueFull:
+        pass
+    
+    pending = []
+    while not outbox.empty():
+        pending.append(outbox.get_nowait())
+    pending.append(message)
+    
+    kept = []
+    collapsed = False
+    for m in pending:
+        if m is _STREAM_END:
+            kept.append(m)
+        elif m["type"] in _STEP_MESSAGE_TYPES:
+            if snapshot is not None and not collapsed:
+                kept.append(snapshot)
+                collapsed = True
+        elif m["type"] != "token":
+            kept.append(m)
+    for m in kept:
+        await outbox.put(m)  # waits for the writer only if nothing could be collapsed
+
+
+def _offer_token(outbox: asyncio.Queue, message: Dict[str, Any]):
+    """Queue a token frame; tokens are best effort and dropped while the client is behind."""
+    if not outbox.full():
+        outbox.put_nowait(message)
+
+
+async def _write_messages(websocket: WebSocket, outbox: asyncio.Queue):
+    """
+    Per-connection writer: sends everything queued since its last send, so a
+    slow client delays frames rather than the workflow loop. Frames arriving
+    within WS_COALESCE_SECONDS of each other are sent together: consecutive step
+    messages go out as one step_update_batch frame and queued tokens as one
+    token frame per agent; others keep their own frame and their order.
+    Returns after sending what preceded _STREAM_END.
+    """
+    async def flush(steps: list, tokens: Dict[str, list]):
+        if len(steps) == 1:
+            await _send_message(websocket, steps[0])
+        elif steps:
+            await _send_message(websocket, {"type": "step_update_batch", "updates": steps})
+        for agent, chunks in tokens.items():
+            await _send_message(websocket, {"type": "token", "agent": agent, "chunk": "".join(chunks)})
+    
+    while True:
+        steps, tokens = [], {}
+        for message in await _drain(outbox, linger=WS_COALESCE_SECONDS):
+            if message is not _STREAM_END:
+                if message["type"] in _STEP_MESSAGE_TYPES:
+                    steps.append(message)
+                    continue
+                if message["type"] == "token":
+                    tokens.setdefault(message["agent"], []).append(message["chunk"])
+                    continue
+            
+            await flush(steps, tokens)
+            steps, tokens = [], {}
+            if message is _STREAM_END:
+                return
+            await _send_message(websocket, message)
+        
+        await flush(steps, tokens)
+
+
+# Packs msgpack frames; only ever used from the event loop thread
+_msgpack_packer = msgpack.Packer(use_bin_type=True)
+
+
+async def _send_message(websocket: WebSocket, payload: Dict[str, Any]):
+    """
+    Send a message as one binary frame. Clients that connect with
+    ?encoding=msgpack get msgpack (smaller for the repetitive plan /
+    generated_files payloads); everyone else gets UTF-8 JSON from orjson,
+    which the extension parses the same way as a text frame.
+    """
+    if websocket.query_params.get("encoding") == "msgpack":
+        await websocket.send_bytes(_msgpack_packer.pack(payload))
+    else:
+        await websocket.send_bytes(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS))
+
+
+def _file_summaries(file_contents: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """{path: {"sha", "size"}} - step messages carry these instead of file bodies."""
+    return {
+        path: {
+            "sha": hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest(),
+            "size": len(content),
+        }
+        for path, content in file_contents.items()
+    }
+
+
+def _step_update(step_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "step_update",
+        "active_agent": step_state.get("active_agent"),
+        "current_step": step_state.get("current_step"),
+        "plan": step_state.get("plan", []),
+        "generated_files": step_state.get("generated_files", []),
+        "file_summaries": _file_summaries(step_state.get("file_contents") or {}),
+        "needs_review": step_state.get("needs_review", False),
+        "done": step_state.get("done", False)
+    }
+
+
+# step_update fields compared one by one when building a step_patch
+_PATCH_FIELDS = ("active_agent", "current_step", "needs_review", "done")
+
+# List fields that mostly grow at the end: a step_patch sends only the new
+# tail as "<field>_append" when the previous list is still a prefix
+_APPEND_FIELDS = ("plan", "generated_files")
+
+
+def _step_message(step_state: Dict[str, Any], last_sent: Optional[Dict[str, Any]]):
+    """
+    Build the message for one step. The first step of a connection is a full
+    step_update; after that a step_patch carries only the fields that changed,
+    only the new entries of plan / generated_files when they just grew, and
+    only the file summaries that changed (plus removed_files, if any).
+    File bodies are fetched from GET /workflow/{session_id}/file.
+
+    Returns (message, snapshot) - the snapshot is the full step_update the
+    extension holds after applying the message, for diffing the next step.
+    message is None when the step changed nothing the extension sees.
+    """
+    snapshot = _step_update(step_state)
+    if last_sent is None:
+        return snapshot, snapshot
+    
+    patch: Dict[str, Any] = {"type": "step_patch"}
+    for key in _PATCH_FIELDS:
+        if snapshot[key] != last_sent[key]:
+            patch[key] = snapshot[key]
+    
+    for key in _APPEND_FIELDS:
+        new, old = snapshot[key], last_sent[key]
+        if new == old:
+            continue
+        if len(new) > len(old) and new[:len(old)] == old:
+            patch[key + "_append"] = new[len(old):]
+        else:
+            patch[key] = new
+    
+    files, previous_files = snapshot["file_summaries"], last_sent["file_summaries"]
+    changed = {path: summary for path, summary in files.items() if previous_files.get(path) != summary}
+    removed = [path for path in previous_files if path not in files]
+    if changed:
+        patch["file_summaries"] = changed
+    if removed:
+        patch["removed_files"] = removed
+    if len(patch) == 1:
+        return None, snapshot  # nothing the extension shows has changed
+    return patch, snapshot
 
 
 # Request/Response Models
 class WorkflowStartRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
     request: str
     project_path: str
 
 
 class ReviewFeedbackRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
     session_id: str
     feedback: str
     action: str
@@ -80,7 +456,7 @@ def root():
         "status": "running",
         "service": "Agentic IDE Backend",
         "timestamp": datetime.utcnow().isoformat(),
-        "langsmith_tracing": os.getenv("LANGCHAIN_TRACING_V2", "false")
+        "langsmith_tracing": LANGSMITH_TRACING
     }
 
 
@@ -95,25 +471,20 @@ def health():
 def health():
     status = {
         "status": "healthy",
-        "langsmith_tracing": os.getenv("LANGCHAIN_TRACING_V2", "false"),
-        "active_sessions": len(active_sessions),
-        "database": "not_configured"
+        "langsmith_tracing": LANGSMITH_TRACING,
+        # Counted for the in-memory store only: Redis would need a full SCAN
+        "active_sessions": len(active_sessions) if isinstance(active_sessions, SessionStore) else None,
+        "active_runs": _active_runs,
+        "database": "not_configured",
+        "prompt_versions": PROMPTS_MANIFEST
     }
     
-    # Check database connection
+    # Check database connection: a pooled ping, no new connection or setup
     database_url = os.getenv("DATABASE_URL")
     if database_url:
         try:
-            import psycopg
-            from langgraph.checkpoint.postgres import PostgresSaver
-            
-            # Test connection
-            conn = psycopg.connect(database_url)
-            checkpointer = PostgresSaver(conn)
-            checkpointer.setup()
-            
-            # Close test connection
-            conn.close()
+            with get_db_pool().connection(timeout=5) as conn:
+                conn.execute("SELECT 1")
             
             status["database"] = "connected"
         except Exception as e:
@@ -134,33 +505,22 @@ async def start_workflow(req: WorkflowStartRequest, request: Request):
         )
     
     try:
-        session_id = f"session_{datetime.now().timestamp()}"
-        
-        # Set PROJECT_ROOT for file operations
-        os.environ["PROJECT_ROOT"] = req.project_path
-        
-        print(f"\n{'='*70}")
-        print(f"Starting workflow: {session_id}")
-        print(f"Request: {req.request[:100]}...")
-        print(f"Project: {req.project_path}")
-        print(f"LangSmith: {os.getenv('LANGCHAIN_TRACING_V2', 'false')}")
-        print(f"{'='*70}\n")
+        session_id = f"session_{time.time_ns()}"
         
-        # Create workflow with checkpointing
-        workflow_app = create_workflow()
-        
-        # ✅ Create initial state (skip_review=False for production)
-        initial_state = create_initial_state(req.request, skip_review=False)
-        initial_state["project_path"] = req.project_path
+        logger.debug(
+            "[Server] Starting workflow: %s | Request: %.100s... | Project: %s | LangSmith: %s",
+            session_id, req.request, req.project_path, LANGSMITH_TRACING,
+        )
         
-        # ✅ Store session with thread_id for checkpointing
-        active_sessions[session_id] = {
-            "workflow": workflow_app,
-            "state": initial_state,
+        # ✅ Store session with thread_id for checkpointing. Only plain
+        # metadata: the initial state is built when the WebSocket connects and
+        # the compiled workflow is shared, so any worker can run the session
+        await active_sessions.set(session_id, {
+            "request": req.request,
             "status": "created",
             "project_path": req.project_path,
             "thread_id": session_id  # Use session_id as thread_id
-        }
+        })
         
         return {
             "session_id": session_id,
@@ -169,41 +529,39 @@ async def start_workflow(req: WorkflowStartRequest, request: Request):
         }
         
     except Exception as e:
-        print(f"Error starting workflow: {e}")
-        traceback.print_exc()
+        logger.exception("Error starting workflow: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/workflow/review")
 async def submit_review(review: ReviewFeedbackRequest):
     """Submit review feedback and update checkpoint"""
-    if review.session_id not in active_sessions:
+    async with _session_lock(review.session_id):
+        return await _apply_review(review)
+
+
+async def _apply_review(review: ReviewFeedbackRequest):
+    session = await active_sessions.get(review.session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = active_sessions[review.session_id]
-    workflow = session["workflow"]
+    workflow = app.state.workflow_app
     thread_id = session["thread_id"]
     
-    print(f"\n{'='*70}")
-    print(f"Review feedback: {review.session_id}")
-    print(f"Action: {review.action}")
-    print(f"Feedback: {review.feedback[:100] if review.feedback else '(empty)'}")
-    print(f"{'='*70}\n")
+    logger.info(
+        "\n%s\nReview feedback: %s\nAction: %s\nFeedback: %.100s\n%s\n",
+        _BAR, review.session_id, review.action, review.feedback or "(empty)", _BAR,
+    )
     
     # Process review
-    approval_keywords = ['looks good', 'approve', 'done', 'ok', 'lgtm']
-    is_approval = (
-        review.action == "approve" or
-        not review.feedback.strip() or
-        any(kw in review.feedback.lower() for kw in approval_keywords)
-    )
+    is_approval = review.action == "approve" or is_approval_feedback(review.feedback)
     
     # ✅ Update the checkpointed state using LangGraph's update_state
     config = {"configurable": {"thread_id": thread_id}}
     
     try:
         if is_approval:
-            print("✅ User approved - updating checkpoint")
+            logger.info("✅ User approved - updating checkpoint")
             # ✅ Update checkpoint with approval
             workflow.update_state(
                 config,
@@ -214,8 +572,9 @@ async def submit_review(review: ReviewFeedbackRequest):
                 }
             )
             session["status"] = "resuming"
+            await active_sessions.set(review.session_id, session)  # persist the status
         else:
-            print("🔄 User requested changes - updating checkpoint")
+            logger.info("🔄 User requested changes - updating checkpoint")
             # ✅ Update checkpoint with feedback for changes
             workflow.update_state(
                 config,
@@ -226,6 +585,7 @@ async def submit_review(review: ReviewFeedbackRequest):
                 }
             )
             session["status"] = "resuming"
+            await active_sessions.set(review.session_id, session)  # persist the status
         
         return {
             "status": "success",
@@ -233,42 +593,79 @@ async def submit_review(review: ReviewFeedbackRequest):
         }
         
     except Exception as e:
-        print(f"Error updating checkpoint: {e}")
-        traceback.print_exc()
+        logger.exception("Error updating checkpoint: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to update checkpoint: {str(e)}")
 
 
+@app.get("/workflow/{session_id}/file")
+async def get_file(session_id: str, path: str):
+    """Latest generated contents of one file, read from the session's checkpoint"""
+    session = await active_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    config = {"configurable": {"thread_id": session["thread_id"]}}
+    # The checkpointer is sync (PostgresSaver): read it off the event loop
+    checkpoint = await asyncio.to_thread(app.state.workflow_app.get_state, config)
+    file_contents = checkpoint.values.get("file_contents") or {}
+    if path not in file_contents:
+        raise HTTPException(status_code=404, detail=f"File not found: {path}")
+    
+    content = file_contents[path]
+    sha = _file_summaries({path: content})[path]["sha"]
+    return PlainTextResponse(content, headers={"ETag": f'"{sha}"'})
+
+
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     """WebSocket for real-time workflow execution with checkpointing"""
+    # Accept first, so a run waiting for a slot holds an open connection
+    # (and is told it is queued) instead of a handshake the client times out
     await websocket.accept()
     
-    print(f"\n{'='*70}")
-    print(f"WebSocket connected: {session_id}")
-    print(f"{'='*70}\n")
+    logger.debug("[Server] WebSocket connected: %s", session_id)
+    
+    # A second connection for the session waits instead of running the same
+    # thread twice; a review update waits for the stream to stop
+    async with _session_lock(session_id):
+        if _active_runs >= MAX_CONCURRENT_RUNS:
+            await _send_message(websocket, {"type": "status", "status": "queued"})
+        await _acquire_run_slot()
+        try:
+            await _stream_session(websocket, session_id)
+        finally:
+            await _release_run_slot()
+
+
+async def _stream_session(websocket: WebSocket, session_id: str):
     
-    if session_id not in active_sessions:
-        await websocket.send_json({"type": "error", "message": "Session not found"})
+    session = await active_sessions.get(session_id)
+    if session is None:
+        await _send_message(websocket, {"type": "error", "message": "Session not found"})
         await websocket.close()
         return
     
-    session = active_sessions[session_id]
-    workflow = session["workflow"]
-    initial_state = session.get("state")
+    workflow = app.state.workflow_app
     thread_id = session["thread_id"]
     
+    # Outbound frames go through a queue drained by a writer task
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+    writer = asyncio.create_task(_write_messages(websocket, outbox))
+    
     try:
         # ✅ Determine if this is initial run or resuming from checkpoint
         is_resuming = session.get("status") == "resuming"
         
         if is_resuming:
-            print(f"▶️  Resuming workflow from checkpoint...")
+            logger.info("▶️  Resuming workflow from checkpoint...")
             session["status"] = "running"
             stream_state = None  # None = resume from checkpoint
         else:
-            print(f"▶️  Starting new workflow...")
+            logger.info("▶️  Starting new workflow...")
             session["status"] = "running"
-            stream_state = initial_state  # Start with initial state
+            # ✅ Create initial state (skip_review=False for production)
+            stream_state = create_initial_state(session["request"], skip_review=False)
+            stream_state["project_path"] = session["project_path"]
         
         # ✅ Config with thread_id for checkpointing
         config = {
@@ -277,104 +674,152 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         }
         
         # Create workflow stream WITH LANGSMITH TRACING AND CHECKPOINTING
-        workflow_stream = run_workflow_with_tracing(
+        workflow_stream = run_workflow_with_tracing_async(
             workflow,
             stream_state,  # None if resuming, initial_state if starting
             config=config
         )
         
         step_idx = 0
+        log_steps = logger.isEnabledFor(logging.DEBUG)  # per-step lines are DEBUG only
+        final_state = {}
+        last_sent = None  # what the extension holds after our last message
         
         # ✅ ADD TIMEOUT TRACKING
         start_time = asyncio.get_event_loop().time()
         
-        # Stream workflow execution
-        for step_state in workflow_stream:
-            # ✅ CHECK TIMEOUT
-            elapsed = asyncio.get_event_loop().time() - start_time
-            if elapsed > WORKFLOW_TIMEOUT_SECONDS:
-                print(f"⏰ Workflow timeout after {elapsed:.1f}s")
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Workflow timeout after {WORKFLOW_TIMEOUT_SECONDS} seconds. Please try a simpler request or break it into smaller tasks."
-                })
-                session["status"] = "timeout"
-                break
-            
-            # Update session state
-            session["state"] = step_state
-            
-            # Send update to extension
-            await websocket.send_json({
-                "type": "step_update",
-                "active_agent": step_state.get("active_agent"),
-                "current_step": step_state.get("current_step"),
-                "plan": step_state.get("plan", []),
-                "generated_files": step_state.get("generated_files", []),
-                "file_contents": step_state.get("file_contents", {}),
-                "needs_review": step_state.get("needs_review", False),
-                "done": step_state.get("done", False)
-            })
-            
-            print(f"Step {step_idx}: {step_state.get('active_agent')} | "
-                  f"Review: {step_state.get('needs_review')} | "
-                  f"Done: {step_state.get('done')}")
-            
-            step_idx += 1
-            
-            # ✅ Check if workflow is paused for review (due to interrupt)
-            if step_state.get("needs_review") and not step_state.get("done"):
-                print(f"\n⏸️  Workflow interrupted for review (checkpoint saved)")
-                await websocket.send_json({
-                    "type": "review_required",
-                    "plan": step_state.get("plan", []),
-                    "generated_files": step_state.get("generated_files", []),
-                    "file_contents": step_state.get("file_contents", {})
-                })
-                session["status"] = "paused_for_review"
-                # ✅ Workflow is paused via interrupt() - generator stops naturally
-                # Loop will end when interrupt stops yielding states
+        # Steps are produced in the background; every state that is ready by
+        # the time we send goes out in one frame (a single step when the
+        # workflow is slow, a batch when nodes finish in a burst)
+        step_queue: asyncio.Queue = asyncio.Queue()
         
-        # After loop ends, check final state
-        final_state = session.get("state", {})
+        # File tools work in this session's project, not a process-wide setting
+        project_root_var.set(resolve_project_root(session["project_path"]))
+        
+        # LLM tokens the agents stream (on other threads) go out as token frames
+        loop = asyncio.get_running_loop()
+        llm_token_sink.set(lambda agent, text: loop.call_soon_threadsafe(
+            _offer_token, outbox, {"type": "token", "agent": agent, "chunk": text}
+        ))
+        producer = asyncio.create_task(_produce_steps(workflow_stream, step_queue))
+        watchdog = asyncio.create_task(_watch_disconnect(websocket, producer, step_queue))
         
+        try:
+            finished = False
+            while not finished:
+                step_states = []
+                for item in await _drain(step_queue):
+                    if item is _STREAM_END:
+                        finished = True
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    step_states.append(item)
+                
+                if writer.done():
+                    writer.result()  # the client went away: re-raise here
+                
+                if not step_states:
+                    continue
+                
+                # ✅ CHECK TIMEOUT
+                elapsed = asyncio.get_event_loop().time() - start_time
+                if elapsed > WORKFLOW_TIMEOUT_SECONDS:
+                    logger.info("⏰ Workflow timeout after %.1fs", elapsed)
+                    await _offer(outbox, last_sent, {
+                        "type": "error",
+                        "message": f"Workflow timeout after {WORKFLOW_TIMEOUT_SECONDS} seconds. Please try a simpler request or break it into smaller tasks."
+                    })
+                    session["status"] = "timeout"
+                    break
+                
+                # Latest workflow state
+                final_state = step_states[-1]
+                
+                # Queue update(s) for the extension - deltas against what it
+                # already has. The snapshot holds the fields read below, so
+                # each step's state is only looked up once
+                review_state = review_snapshot = None
+                for step_state in step_states:
+                    message, last_sent = _step_message(step_state, last_sent)
+                    if message is not None:
+                        await _offer(outbox, last_sent, message)
+                    
+                    needs_review, done = last_sent["needs_review"], last_sent["done"]
+                    if log_steps:
+                        logger.debug("Step %d: %s | Review: %s | Done: %s",
+                                     step_idx, last_sent["active_agent"], needs_review, done)
+                    step_idx += 1
+                    if needs_review and not done:
+                        review_state, review_snapshot = step_state, last_sent
+                
+                # ✅ Check if workflow is paused for review (due to interrupt)
+                if review_state is not None:
+                    logger.info("\n⏸️  Workflow interrupted for review (checkpoint saved)")
+                    await _offer(outbox, last_sent, {
+                        "type": "review_required",
+                        "plan": review_snapshot["plan"],
+                        "generated_files": review_snapshot["generated_files"],
+                        "file_contents": review_state.get("file_contents", {})
+                    })
+                    session["status"] = "paused_for_review"
+                    # ✅ Workflow is paused via interrupt() - generator stops naturally
+                    # Loop will end when interrupt stops yielding states
+        finally:
+            producer.cancel()
+            watchdog.cancel()
+        
+        # After loop ends, check final state
         if final_state.get("done"):
-            print(f"\n✅ Workflow completed")
-            await websocket.send_json({
+            logger.info("\n✅ Workflow completed")
+            await _offer(outbox, last_sent, {
                 "type": "workflow_complete",
                 "generated_files": final_state.get("generated_files", []),
                 "file_contents": final_state.get("file_contents", {})
             })
             session["status"] = "completed"
         elif final_state.get("needs_review"):
-            print(f"\n⏸️  Workflow paused - waiting for review")
+            logger.info("\n⏸️  Workflow paused - waiting for review")
             session["status"] = "paused_for_review"
         
-        print(f"\n{'='*70}")
-        print(f"WebSocket stream ended: {session_id}")
-        print(f"Status: {session['status']}")
-        print(f"{'='*70}\n")
+        await active_sessions.set(session_id, session)  # persist the final status
+        if session["status"] in _FINISHED_STATUSES:
+            _spawn(_release_finished_session(session_id))
+        
+        # Flush everything still queued before the socket is closed
+        await outbox.put(_STREAM_END)
+        await writer
+        
+        logger.info("\n%s\nWebSocket stream ended: %s\nStatus: %s\n%s\n",
+                    _BAR, session_id, session["status"], _BAR)
         
     except WebSocketDisconnect:
-        print(f"WebSocket disconnected: {session_id}")
-        session["status"] = "disconnected"
+        logger.info("WebSocket disconnected: %s", session_id)
+        # A session paused for review is resumed over a new connection later
+        if session.get("status") == "paused_for_review":
+            await active_sessions.set(session_id, session)
+        else:
+            session["status"] = "disconnected"
+            await _discard_session(session_id)
     
     except Exception as e:
-        print(f"Error in WebSocket: {e}")
-        traceback.print_exc()
+        logger.exception("Error in WebSocket %s: %s", session_id, e)
+        writer.cancel()
         
         try:
-            await websocket.send_json({
-                "type": "error",
-                "message": str(e),
-                "traceback": traceback.format_exc()
-            })
+            error = {"type": "error", "message": str(e)}
+            # Tracebacks stay server-side unless debugging
+            if DEBUG:
+                error["traceback"] = traceback.format_exc()
+            await _send_message(websocket, error)
         except:
             pass
         
         session["status"] = "error"
+        await _discard_session(session_id)
         
     finally:
+        writer.cancel()
         try:
             await websocket.close()
         except:
@@ -383,37 +828,58 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
 @app.delete("/workflow/{session_id}")
 async def delete_session(session_id: str):
     """Clean up a workflow session"""
-    if session_id in active_sessions:
-        del active_sessions[session_id]
+    if await _discard_session(session_id):
         return {"status": "deleted", "session_id": session_id}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
 
 
 if __name__ == "__main__":
+    import sys
+    from shared.ws_protocol import LargeBufferWebSocketProtocol
     import uvicorn  # used to run asynchronous python web applications often with frameworks like fast API
     
     port = int(os.getenv("PORT", 8000))
     
-    print("\n" + "="*70)
-    print("🚀 Starting Agentic IDE Backend Server")
-    print("="*70)
-    print(f"Server: http://localhost:{port}")
-    print(f"WebSocket: ws://localhost:{port}/ws/{{session_id}}")
-    print(f"Health: http://localhost:{port}/health")
+    # Heartbeats: a client that stops answering pings is dropped within
+    # interval + timeout seconds, and _watch_disconnect then cancels its run
+    ws_ping_interval = float(os.getenv("WS_PING_INTERVAL", "5"))
+    ws_ping_timeout = float(os.getenv("WS_PING_TIMEOUT", "5"))
+    
+    logger.info("\n%s\n🚀 Starting Agentic IDE Backend Server\n%s", _BAR, _BAR)
+    logger.info("Server: http://localhost:%d", port)
+    logger.info("WebSocket: ws://localhost:%d/ws/{session_id}", port)
+    logger.info("Health: http://localhost:%d/health", port)
     
     # Show LangSmith status
-    if os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true":
-        print(f"🔍 LangSmith: ENABLED")
-        print(f"📊 Project: {os.getenv('LANGCHAIN_PROJECT', 'default')}")
+    if LANGSMITH_TRACING.lower() == "true":
+        logger.info("🔍 LangSmith: ENABLED")
+        logger.info("📊 Project: %s", LANGSMITH_PROJECT)
     else:
-        print(f"⚠️  LangSmith: DISABLED (set LANGCHAIN_TRACING_V2=true to enable)")
+        logger.info("⚠️  LangSmith: DISABLED (set LANGCHAIN_TRACING_V2=true to enable)")
+    
+    logger.info("%s\n", _BAR)
     
-    print("="*70 + "\n")
+    # Several worker processes need sessions in Redis (and checkpoints in
+    # PostgreSQL) so that any worker can serve any session
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and not isinstance(active_sessions, RedisSessionStore):
+        logger.warning("⚠️  WEB_CONCURRENCY=%d ignored - sessions are in memory (set REDIS_URL)", workers)
+        workers = 1
     
+    # uvloop + httptools (C event loop and HTTP parser); uvloop has no Windows build
     uvicorn.run(
-        app,
+        "server:app" if workers > 1 else app,
+        workers=workers,
         host="0.0.0.0",
         port=port,
-        log_level="info"
+        log_level="info",
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws=LargeBufferWebSocketProtocol,  # websockets impl, 1 MiB write buffer (WS_WRITE_LIMIT)
+        # review_required / workflow_complete frames carry whole source files,
+        # which compress well; the extension's ws client negotiates deflate
+        ws_per_message_deflate=True,
+        ws_ping_interval=ws_ping_interval,
+        ws_ping_timeout=ws_ping_timeout
     )
\ No newline at end of file
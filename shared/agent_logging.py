@@ -0,0 +1,82 @@
+# shared/agent_logging.py
+
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Records are buffered and written in batches; a batch goes out when it is
+# full, when a WARNING+ record arrives, or once the oldest record is this old.
+LOG_BUFFER_CAPACITY = 100
+LOG_FLUSH_INTERVAL = 0.5  # seconds
+
+
+class BufferedLogHandler(MemoryHandler):
+    """
+    MemoryHandler with a time bound, so status lines still show up promptly
+    in the VS Code output panel instead of waiting for a full buffer.
+    """
+
+    def __init__(self, capacity: int, flush_interval: float, target: logging.Handler):
+        super().__init__(capacity, flushLevel=logging.WARNING, target=target)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return (
+            super().shouldFlush(record)
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def flush(self):
+        super().flush()
+        self._last_flush = time.monotonic()
+
+
+_handler = None
+_listener = None
+_handler_lock = threading.Lock()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Return a logger under the "agent" namespace. The first call installs the
+    handler on "agent" (not on the root logger, which uvicorn configures for
+    itself): records are queued, and a listener thread does the buffered
+    stdout writes, so callers - including the event loop - never wait on I/O.
+    """
+    global _handler, _listener
+    with _handler_lock:
+        if _handler is None:
+            stream = logging.StreamHandler(sys.stdout)
+            stream.setFormatter(logging.Formatter("%(message)s"))
+            _handler = BufferedLogHandler(LOG_BUFFER_CAPACITY, LOG_FLUSH_INTERVAL, stream)
+
+            records = queue.SimpleQueue()
+            _listener = QueueListener(records, _handler)
+            _listener.start()
+
+            agent_logger = logging.getLogger("agent")
+            agent_logger.addHandler(QueueHandler(records))
+            agent_logger.setLevel(LOG_LEVEL)
+            agent_logger.propagate = False
+            atexit.register(_stop_listener)
+    return logging.getLogger(name)
+
+
+def _stop_listener():
+    """Write out every queued record at exit."""
+    _listener.stop()
+    _handler.flush()
+
+
+def flush_logs():
+    """Write out buffered records, e.g. when a graph node finishes."""
+    if _handler is not None:
+        _handler.flush()
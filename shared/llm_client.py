@@ -0,0 +1,80 @@
+# shared/llm_client.py
+
+import os
+import threading
+from functools import cache
+from pathlib import Path
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+
+LLM_MODEL_NAME = "gpt-4o-mini"
+
+# One connection pool for every agent, so TLS handshakes and HTTP/2
+# connections are reused across turns instead of per agent module.
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+# Completions for identical (prompt, params) can be reused instead of paying
+# for another round trip. Opt-in, since a replayed completion hides changes in
+# the project between turns: LLM_CACHE=off (default), memory (per process) or
+# sqlite (kept in LLM_CACHE_PATH across restarts). A relative LLM_CACHE_PATH
+# is resolved against the repository directory, not the working directory.
+LLM_CACHE = os.getenv("LLM_CACHE", "off").lower()
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+LLM_CACHE_PATH = str(Path(__file__).resolve().parent.parent / os.getenv("LLM_CACHE_PATH", ".langchain.db"))
+
+@cache
+def get_openai_key() -> str:
+    """
+    Read OPENAI_API_KEY once, on first LLM use (loading .env if present),
+    instead of every agent module mutating os.environ at import.
+    """
+    load_dotenv()
+    return os.environ.get("OPENAI_API_KEY", "")
+
+
+@cache
+def get_llm_cache():
+    """
+    The LLM cache selected by LLM_CACHE, or None when it is off. Keys include
+    the bound tools and model params, so only truly identical calls hit.
+    """
+    if LLM_CACHE == "off":
+        return None
+    
+    if LLM_CACHE == "sqlite":
+        try:
+            from langchain_community.cache import SQLiteCache
+            return SQLiteCache(database_path=LLM_CACHE_PATH)
+        except Exception as e:
+            print(f"❌ Failed to open SQLite LLM cache: {e}")
+            print("⚠️  Falling back to in-memory LLM cache")
+    
+    from langchain_core.caches import InMemoryCache
+    return InMemoryCache(maxsize=LLM_CACHE_SIZE)
+
+
+_chat_model = None
+_chat_model_lock = threading.Lock()
+
+
+def get_chat_model() -> ChatOpenAI:
+    """
+    Return the process-wide ChatOpenAI client. Agents call .bind_tools() on it,
+    which creates a lightweight wrapper and keeps the shared HTTP clients.
+
+    The async client binds to the agent event loop (see
+    workflow_tools.parallel_tools.run_sync), which lives for the whole process.
+    """
+    global _chat_model
+    with _chat_model_lock:
+        if _chat_model is None:
+            _chat_model = ChatOpenAI(
+                model=LLM_MODEL_NAME,
+                api_key=get_openai_key() or None,  # None: let the SDK report the missing key
+                http_client=httpx.Client(http2=True, limits=HTTP_LIMITS),
+                http_async_client=httpx.AsyncClient(http2=True, limits=HTTP_LIMITS),
+                cache=get_llm_cache(),
+            )
+        return _chat_model
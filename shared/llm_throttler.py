@@ -0,0 +1,149 @@
+# shared/llm_throttler.py
+
+import asyncio
+import os
+import threading
+import time
+from functools import lru_cache
+
+import tiktoken
+
+from shared.agent_logging import get_logger
+
+logger = get_logger("agent.throttler")
+
+# Account limits for the OpenAI key (requests / tokens per minute).
+# Defaults match gpt-4o-mini on a tier-1 key; override via env.
+OPENAI_MAX_RPM = int(os.getenv("OPENAI_MAX_RPM", "500"))
+OPENAI_MAX_TPM = int(os.getenv("OPENAI_MAX_TPM", "200000"))
+
+# Tokens reserved per request for the completion, which can't be known up front
+COMPLETION_TOKEN_RESERVE = 512
+
+
+@lru_cache(maxsize=None)
+def _encoding(model_name: str):
+    """
+    The tiktoken encoding for the model, or None when it can't be loaded (the
+    BPE files are downloaded on first use, which fails offline). The result is
+    cached either way, so a failed load is not retried on every request.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"⚠️  tiktoken encoding unavailable ({e}) - estimating tokens from text length")
+        return None
+
+
+def _count_tokens(encoding, text: str) -> int:
+    if encoding is None:
+        return len(text) // 4  # ~4 characters per token for English text and code
+    return len(encoding.encode(text))
+
+
+@lru_cache(maxsize=32)
+def count_prompt_tokens(text: str, model_name: str = "gpt-4o-mini") -> int:
+    """Token count of a static prompt segment, encoded once per process."""
+    return _count_tokens(_encoding(model_name), text)
+
+
+def estimate_tokens(messages, model_name: str = "gpt-4o-mini") -> int:
+    """
+    Estimate the token cost of one chat request: prompt tokens plus a small
+    per-message overhead and a fixed reserve for the completion.
+
+    System messages carry the frozen prompts from prompts.prompts_list, which
+    are identical on every call, so their counts come from a cache instead of
+    re-running BPE over several KB of text per request.
+    """
+    encoding = _encoding(model_name)
+    total = COMPLETION_TOKEN_RESERVE
+    for message in messages:
+        total += 4  # role / separator overhead per message
+        content = str(getattr(message, "content", "") or "")
+        if getattr(message, "type", None) == "system":
+            total += count_prompt_tokens(content, model_name)
+        else:
+            total += _count_tokens(encoding, content)
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            total += _count_tokens(encoding, str(tool_calls))
+    return total
+
+
+class LLMThrottler:
+    """
+    Token-and-request bucket in front of ChatOpenAI calls.
+
+    Both budgets refill continuously at their per-minute rate. Before each call
+    the caller takes one request and the estimated tokens, sleeping only as long
+    as needed for the bucket to refill - instead of sending the request, hitting
+    a 429 and backing off blindly.
+
+    Thread-safe, so the sync agents (Context/Debug) and the async Code Agent can
+    share one process-wide budget.
+    """
+
+    def __init__(self, max_requests_per_minute: int, max_tokens_per_minute: int):
+        self.max_requests = float(max_requests_per_minute)
+        self.max_tokens = float(max_tokens_per_minute)
+        self.available_requests = self.max_requests
+        self.available_tokens = self.max_tokens
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+        self.available_requests = min(
+            self.max_requests, self.available_requests + elapsed * self.max_requests / 60.0
+        )
+        self.available_tokens = min(
+            self.max_tokens, self.available_tokens + elapsed * self.max_tokens / 60.0
+        )
+
+    def _try_take(self, tokens: int) -> float:
+        """Take capacity if available; otherwise return seconds until it will be."""
+        tokens = min(tokens, self.max_tokens)  # a single oversized request must still go through
+        with self._lock:
+            self._refill()
+            if self.available_requests >= 1 and self.available_tokens >= tokens:
+                self.available_requests -= 1
+                self.available_tokens -= tokens
+                return 0.0
+
+            request_wait = (1 - self.available_requests) * 60.0 / self.max_requests
+            token_wait = (tokens - self.available_tokens) * 60.0 / self.max_tokens
+            return max(request_wait, token_wait, 0.01)
+
+    def acquire(self, tokens: int):
+        while (wait := self._try_take(tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int):
+        while (wait := self._try_take(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def invoke(self, model, messages):
+        """Throttled model.invoke(messages)."""
+        self.acquire(estimate_tokens(messages))
+        return model.invoke(messages)
+
+    async def ainvoke(self, model, messages):
+        """Throttled await model.ainvoke(messages)."""
+        await self.aacquire(estimate_tokens(messages))
+        return await model.ainvoke(messages)
+
+    async def abatch(self, model, inputs: list):
+        """Throttled await model.abatch(inputs); capacity is taken per request."""
+        for messages in inputs:
+            await self.aacquire(estimate_tokens(messages))
+        return await model.abatch(inputs)
+
+
+# Process-wide throttler shared by every agent (they all use one API key)
+llm_throttler = LLMThrottler(OPENAI_MAX_RPM, OPENAI_MAX_TPM)
@@ -0,0 +1,135 @@
+# shared/session_store.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+
+
+class SessionStore:
+    """
+    Bounded in-memory session map for the API server.
+
+    Sessions expire after `ttl` seconds without being looked up (a session
+    paused for review stays alive as long as the extension keeps using it),
+    and once more than `maxsize` are held the least recently used is dropped.
+    `on_evict(session_id, session)` is called for every session dropped that
+    way (from the coroutine that noticed it), so the server can release what
+    the session held.
+
+    The methods are coroutines, to share one interface with RedisSessionStore;
+    they never actually wait.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, on_evict: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float) -> list:
+        evicted = []
+        while self._sessions:
+            session_id, (last_used, session) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl:
+                break
+            del self._sessions[session_id]
+            evicted.append((session_id, session))
+        return evicted
+
+    def _notify(self, evicted: list):
+        # Outside the lock: on_evict may use the store again
+        if self.on_evict is not None:
+            for session_id, session in evicted:
+                self.on_evict(session_id, session)
+
+    async def get(self, session_id: str, default: Optional[Dict[str, Any]] = None):
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict_expired(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions[session_id] = (now, entry[1])
+                self._sessions.move_to_end(session_id)
+        self._notify(evicted)
+        return default if entry is None else entry[1]
+
+    async def set(self, session_id: str, session: Dict[str, Any]):
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict_expired(now)
+            self._sessions[session_id] = (now, session)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.maxsize:
+                old_id, (_, old_session) = self._sessions.popitem(last=False)
+                evicted.append((old_id, old_session))
+        self._notify(evicted)
+
+    async def pop(self, session_id: str, default: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        return default if entry is None else entry[1]
+
+    def __len__(self) -> int:
+        # Counts live sessions without evicting: /health calls this from a
+        # worker thread, where on_evict couldn't run
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for last_used, _ in self._sessions.values() if now - last_used <= self.ttl)
+
+
+class RedisSessionStore:
+    """
+    Session map kept in Redis so every uvicorn worker sees the same sessions.
+    Same interface as SessionStore, on the redis.asyncio client so lookups
+    never block the event loop. Values are JSON (orjson), one key per session,
+    and each lookup pushes the idle TTL back like SessionStore does.
+
+    Returned sessions are copies: set() a modified session to persist it.
+    There is no session count: that would mean a SCAN over the keyspace.
+    """
+
+    def __init__(self, client, ttl: float, prefix: str = "session:"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    async def get(self, session_id: str, default: Optional[Dict[str, Any]] = None):
+        raw = await self.client.getex(self.prefix + session_id, ex=self.ttl)
+        return default if raw is None else orjson.loads(raw)
+
+    async def set(self, session_id: str, session: Dict[str, Any]):
+        await self.client.set(self.prefix + session_id, orjson.dumps(session), ex=self.ttl)
+
+    async def pop(self, session_id: str, default: Optional[Dict[str, Any]] = None):
+        raw = await self.client.getdel(self.prefix + session_id)
+        return default if raw is None else orjson.loads(raw)
+
+
+def create_session_store(maxsize: int, ttl: float, on_evict=None):
+    """
+    Redis-backed store when REDIS_URL is set, in-process SessionStore otherwise.
+    on_evict is only used by the in-process store (Redis expires keys itself).
+    """
+    redis_url = os.getenv("REDIS_URL")
+    
+    if redis_url:
+        try:
+            import redis
+            import redis.asyncio
+            
+            # Check the connection once at startup (before any event loop
+            # runs); the store itself uses the asyncio client
+            with redis.Redis.from_url(redis_url) as check:
+                check.ping()
+            print("🗄️  Using Redis session store")
+            return RedisSessionStore(redis.asyncio.Redis.from_url(redis_url), ttl)
+        except Exception as e:
+            print(f"❌ Failed to connect to Redis: {e}")
+            print("⚠️  Falling back to in-memory session store")
+    
+    return SessionStore(maxsize=maxsize, ttl=ttl, on_evict=on_evict)
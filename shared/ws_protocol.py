@@ -0,0 +1,22 @@
+# shared/ws_protocol.py
+
+import os
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+
+# Transport write-buffer high-water mark per WebSocket; websockets' default is
+# 64 KiB, so a review_required frame with whole files used to be drained in
+# many small steps
+WS_WRITE_LIMIT = int(os.getenv("WS_WRITE_LIMIT", str(1024 * 1024)))
+
+
+class LargeBufferWebSocketProtocol(WebSocketProtocol):
+    """
+    uvicorn's websockets protocol with a larger write buffer. Passed to
+    uvicorn.run(ws=...), since the ASGI app never sees the transport.
+    """
+
+    def connection_made(self, transport):
+        # websockets applies write_limit to the transport in connection_made
+        self.write_limit = WS_WRITE_LIMIT
+        super().connection_made(transport)
@@ -0,0 +1,147 @@
+import os
+
+import pytest
+
+from workflow_tools.filesystemtools import (
+    _RG,
+    PATCH_BYTES_THRESHOLD,
+    _make_parent_dirs,
+    _resolve_under,
+    _search_with_python,
+    _search_with_rg,
+    apply_patch,
+    project_root_var,
+    read_file,
+)
+
+
+@pytest.fixture
+def project_root(tmp_path):
+    token = project_root_var.set(tmp_path)
+    yield tmp_path
+    project_root_var.reset(token)
+
+
+def test_read_file_truncates_multibyte_content_by_chars(project_root):
+    # 60 bytes, small enough to go through the read cache
+    (project_root / "small.txt").write_text("é" * 30, encoding="utf-8")
+
+    result = read_file.invoke({"path": "small.txt", "max_chars": 20})
+
+    assert result == "é" * 20 + "\n\n...[TRUNCATED, 10 more chars]..."
+
+
+def test_read_file_streams_large_multibyte_file_up_to_the_limit(project_root):
+    # 2000 bytes > 4 * max_chars, so only max_chars characters are read
+    (project_root / "large.txt").write_text("é" * 1000, encoding="utf-8")
+
+    result = read_file.invoke({"path": "large.txt", "max_chars": 100})
+
+    content, marker = result.split("\n\n", 1)
+    assert content == "é" * 100
+    assert marker == "...[TRUNCATED, ~1800 more bytes]..."
+
+
+def test_read_file_returns_short_multibyte_file_whole(project_root):
+    (project_root / "short.txt").write_text("ü✓" * 5, encoding="utf-8")
+
+    assert read_file.invoke({"path": "short.txt", "max_chars": 10}) == "ü✓" * 5
+
+
+@pytest.mark.parametrize("size", [100, PATCH_BYTES_THRESHOLD])
+def test_apply_patch_writes_newlines_the_same_way_at_any_size(project_root, size):
+    # CRLF input, below and above the size where apply_patch switches to bytes
+    lines = "x = 1\r\n" * (size // 7 + 1)
+    (project_root / "crlf.py").write_bytes(("target = 0\r\n" + lines).encode("utf-8"))
+
+    result = apply_patch.invoke({"path": "crlf.py", "original_snippet": "target = 0\n", "new_snippet": "target = 1\n"})
+
+    assert result.startswith("Patch applied")
+    expected = ("target = 1\n" + lines.replace("\r\n", "\n")).replace("\n", os.linesep)
+    assert (project_root / "crlf.py").read_bytes() == expected.encode("utf-8")
+
+
+@pytest.fixture
+def search_tree(tmp_path):
+    files = {
+        "b.py": "needle = 1\nneedle = 2\n",
+        "a.py": "needle\n",
+        "a/z.py": "x = 'needle'\n",
+        "a/b/c.py": "needle()\n" * 3,
+        "a.b.py": "# needle\n",
+        "notes.txt": "needle in a text file\n",
+        "node_modules/dep.py": "needle\n",
+    }
+    for rel_path, content in files.items():
+        (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel_path).write_text(content, encoding="utf-8")
+    return tmp_path
+
+
+def test_python_search_reports_matches_in_path_order(search_tree):
+    matches = _search_with_python("needle", "*.py", 50, search_tree)
+
+    assert matches == [
+        "a/b/c.py:1: needle()",
+        "a/b/c.py:2: needle()",
+        "a/b/c.py:3: needle()",
+        "a/z.py:1: x = 'needle'",
+        "a.b.py:1: # needle",
+        "a.py:1: needle",
+        "b.py:1: needle = 1",
+        "b.py:2: needle = 2",
+    ]
+
+
+@pytest.mark.skipif(_RG is None, reason="ripgrep is not installed")
+@pytest.mark.parametrize("max_results", [1, 2, 4, 5, 50])
+def test_ripgrep_and_python_search_return_the_same_matches(search_tree, max_results):
+    expected = _search_with_python("needle", "*.py", max_results, search_tree)
+
+    for _ in range(3):  # rg must not depend on thread scheduling
+        assert _search_with_rg("needle", "*.py", max_results, search_tree) == expected
+
+
+@pytest.fixture
+def sandbox(tmp_path):
+    root = (tmp_path / "proj").resolve()
+    (root / "pkg").mkdir(parents=True)
+    (tmp_path / "proj_evil").mkdir()
+    _resolve_under.cache_clear()
+    return root
+
+
+def test_resolve_under_accepts_the_root_and_paths_inside_it(sandbox):
+    assert _resolve_under(sandbox, ".") == sandbox
+    assert _resolve_under(sandbox, "pkg/mod.py") == sandbox / "pkg" / "mod.py"
+    assert _resolve_under(sandbox, "pkg/../setup.py") == sandbox / "setup.py"
+
+
+@pytest.mark.parametrize("path", ["../proj_evil/x.py", "../proj_evil", "pkg/../../proj_evil/x.py"])
+def test_resolve_under_rejects_a_sibling_with_the_root_as_name_prefix(sandbox, path):
+    with pytest.raises(ValueError):
+        _resolve_under(sandbox, path)
+
+
+@pytest.mark.parametrize("path", ["..", "../outside.txt", "pkg/../../outside.txt", "/etc/passwd"])
+def test_resolve_under_rejects_traversal_out_of_the_root(sandbox, path):
+    with pytest.raises(ValueError):
+        _resolve_under(sandbox, path)
+
+
+def test_resolve_under_rejects_a_symlink_to_the_sibling(sandbox):
+    (sandbox / "link").symlink_to(sandbox.parent / "proj_evil", target_is_directory=True)
+
+    with pytest.raises(ValueError):
+        _resolve_under(sandbox, "link/x.py")
+
+
+def test_make_parent_dirs_clears_the_resolution_cache(sandbox):
+    _resolve_under(sandbox, "pkg/mod.py")
+    _make_parent_dirs(sandbox / "pkg" / "mod.py")  # parent exists: cache kept
+    assert _resolve_under.cache_info().currsize == 1
+
+    _make_parent_dirs(sandbox / "new" / "dir" / "mod.py")
+
+    assert (sandbox / "new" / "dir").is_dir()
+    assert _resolve_under.cache_info().currsize == 0
@@ -0,0 +1,43 @@
+import textwrap
+import unicodedata
+
+from prompts.prompts_list import (
+    CODE_AGENT_PROMPT,
+    CODE_AGENT_SCENARIOS,
+    CONTEXT_AGENT_EXAMPLES,
+    CONTEXT_AGENT_PROMPT,
+    DEBUG_AGENT_PROMPT,
+    DEBUG_AGENT_SCENARIOS,
+    ORCHESTRATOR_PROMPT,
+    _ASCII_PUNCTUATION,
+    _freeze,
+)
+
+
+def test_debug_scenarios_teach_the_calculator_fix_once():
+    # EXAMPLE EXECUTION refers back to Scenario A instead of repeating it
+    assert DEBUG_AGENT_SCENARIOS.count("def kattappa(a, b):") == 2  # before / after, in Scenario A
+    assert "See Scenario A above for the full calculator.py walk-through." in DEBUG_AGENT_SCENARIOS
+    assert len(DEBUG_AGENT_SCENARIOS.encode("utf-8")) <= 3122
+
+
+def test_freeze_ascii_fast_path_matches_full_normalization():
+    text = "\n    Don't touch \"this\" - it's ASCII.\n"
+    full = unicodedata.normalize("NFC", textwrap.dedent(text).strip()).translate(_ASCII_PUNCTUATION) + "\n"
+
+    assert _freeze(text) == full == "Don't touch \"this\" - it's ASCII.\n"
+
+
+def test_freeze_straightens_typographic_punctuation_and_normalizes():
+    text = "  The user’s “plan” – cafe\u0301 — done \U0001f680  "
+
+    assert _freeze(text) == "The user's \"plan\" - café - done \U0001f680\n"
+
+
+def test_frozen_prompts_have_no_typographic_punctuation():
+    prompts = [
+        ORCHESTRATOR_PROMPT, CONTEXT_AGENT_PROMPT, CODE_AGENT_PROMPT, DEBUG_AGENT_PROMPT,
+        CODE_AGENT_SCENARIOS, DEBUG_AGENT_SCENARIOS, *CONTEXT_AGENT_EXAMPLES.values(),
+    ]
+    for prompt in prompts:
+        assert not set(prompt) & {"‘", "’", "“", "”", "–", "—"}
@@ -27,6 +27,7 @@ export interface WebSocketCallbacks {
     onStepUpdate?: (data: any) => void;
     onReviewRequired?: (data: any) => void;
     onComplete?: (data: any) => void;
+    onToken?: (data: { agent: string; chunk: string }) => void;
     onError?: (error: any) => void;
 }
 
@@ -153,24 +154,62 @@ export class BackendClient {
             console.log('🔌 Creating WebSocket connection...');
             const ws = new WebSocket(fullWsUrl);
 
+            // Latest full step_update; step_patch messages are applied on top of it
+            let snapshot: any = null;
+            const applyStepMessage = (update: any) => {
+                if (update.type === 'step_patch' && snapshot) {
+                    const { type, file_summaries, removed_files, plan_append, generated_files_append, ...fields } = update;
+                    const files = { ...snapshot.file_summaries, ...(file_summaries || {}) };
+                    for (const path of removed_files || []) {
+                        delete files[path];
+                    }
+                    snapshot = { ...snapshot, ...fields, file_summaries: files };
+                    // plan / generated_files that only grew arrive as their new tail
+                    if (plan_append) {
+                        snapshot.plan = [...snapshot.plan, ...plan_append];
+                    }
+                    if (generated_files_append) {
+                        snapshot.generated_files = [...snapshot.generated_files, ...generated_files_append];
+                    }
+                } else {
+                    snapshot = update;
+                }
+                callbacks.onStepUpdate?.(snapshot);
+            };
+
             // Added: Connection open handler
             ws.on('open', () => {
                 console.log('✅ WebSocket connection established successfully!');
             });
 
             ws.on('message', (data: WebSocket.Data) => {
-                console.log('📨 WebSocket message received');
-                console.log('   - Raw data:', data.toString());
-                
                 try {
                     const message = JSON.parse(data.toString());
-                    console.log('   - Parsed message:', message);
-                    console.log('   - Message type:', message.type);
+                    // Token frames arrive many times per second - don't log each one
+                    if (message.type !== 'token') {
+                        console.log('📨 WebSocket message received:', message.type);
+                    }
 
                     switch (message.type) {
                         case 'step_update':
-                            console.log('→ Handling step_update');
-                            callbacks.onStepUpdate?.(message);
+                        case 'step_patch':
+                            console.log(`→ Handling ${message.type}`);
+                            applyStepMessage(message);
+                            break;
+                        case 'step_update_batch':
+                            // Several steps finished together - replay them in order
+                            console.log('→ Handling step_update_batch:', message.updates.length, 'updates');
+                            for (const update of message.updates) {
+                                applyStepMessage(update);
+                            }
+                            break;
+                        case 'status':
+                            // e.g. queued while the server is at its concurrent run limit
+                            console.log('→ Workflow status:', message.status);
+                            break;
+                        case 'token':
+                            // Streamed LLM output, appended as it arrives
+                            callbacks.onToken?.(message);
                             break;
                         case 'review_required':
                             console.log('→ Handling review_required');
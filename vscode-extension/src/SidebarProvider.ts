@@ -132,6 +132,13 @@ export class SidebarProvider implements vscode.WebviewViewProvider {
                         agent: data.active_agent
                     });
                 },
+                onToken: (data) => {
+                    this._view?.webview.postMessage({
+                        type: 'token',
+                        agent: data.agent,
+                        chunk: data.chunk
+                    });
+                },
                 onReviewRequired: (data) => {
                     console.log('WebSocket: Review required', data);
                     
@@ -421,8 +428,10 @@ export class SidebarProvider implements vscode.WebviewViewProvider {
                 function openFile(filePath){vscode.postMessage({type:'openFile',filePath:filePath});}
                 function updateProgressList(currentStep,plan){const progressList=document.getElementById('progressList');const progressSteps=document.getElementById('progressSteps');if(!plan||plan.length===0){progressList.classList.remove('active');return;}currentPlan=plan;progressSteps.innerHTML='';plan.forEach((step,index)=>{const stepDiv=document.createElement('div');stepDiv.className='progress-step';const instruction=step.instruction||step.task||'Step '+(index+1);if(index<currentStep){stepDiv.classList.add('completed');stepDiv.innerHTML='<span class=\"step-icon\">✅</span><span class=\"step-text\">'+instruction+'</span>';}else if(index===currentStep){stepDiv.classList.add('current');stepDiv.innerHTML='<span class=\"step-icon\">⏳</span><span class=\"step-text\">'+instruction+'</span>';}else{stepDiv.innerHTML='<span class=\"step-icon\">⭕</span><span class=\"step-text\">'+instruction+'</span>';}progressSteps.appendChild(stepDiv);});progressList.classList.add('active');}
                 function clearProgressList(){document.getElementById('progressList').classList.remove('active');currentPlan=[];}
-                window.addEventListener('message',event=>{const message=event.data;switch(message.type){case 'addMessage':addMessage(message.role,message.content);break;case 'setThinking':isThinking=message.thinking;document.getElementById('thinking').classList.toggle('active',message.thinking);document.getElementById('sendButton').disabled=message.thinking;break;case 'stepUpdate':updateProgressList(message.step,message.plan);break;case 'reviewRequired':showReviewPanel(message.plan,message.files);break;case 'workflowComplete':addMessage('assistant',\`✅ Workflow complete! Generated \${message.files.length} files.\`);if(currentPlan.length>0){updateProgressList(currentPlan.length,currentPlan);}break;case 'error':addMessage('assistant',\`❌ Error: \${message.message}\`);clearProgressList();break;}});
+                window.addEventListener('message',event=>{const message=event.data;switch(message.type){case 'addMessage':addMessage(message.role,message.content);break;case 'setThinking':isThinking=message.thinking;document.getElementById('thinking').classList.toggle('active',message.thinking);document.getElementById('sendButton').disabled=message.thinking;break;case 'stepUpdate':updateProgressList(message.step,message.plan);break;case 'token':appendToken(message.agent,message.chunk);break;case 'reviewRequired':showReviewPanel(message.plan,message.files);break;case 'workflowComplete':addMessage('assistant',\`✅ Workflow complete! Generated \${message.files.length} files.\`);if(currentPlan.length>0){updateProgressList(currentPlan.length,currentPlan);}break;case 'error':addMessage('assistant',\`❌ Error: \${message.message}\`);clearProgressList();break;}});
                 function addMessage(role,content){const messagesDiv=document.getElementById('messages');const emptyState=messagesDiv.querySelector('.empty-state');if(emptyState)emptyState.remove();const messageDiv=document.createElement('div');messageDiv.className='message '+role;messageDiv.innerHTML=\`<div class="role">\${role==='user'?'You':'Agentic IDE'}</div><div class="content">\${content}</div>\`;messagesDiv.appendChild(messageDiv);messagesDiv.scrollTop=messagesDiv.scrollHeight;}
+                let streamDiv=null;let streamAgent=null;
+                function appendToken(agent,chunk){const messagesDiv=document.getElementById('messages');if(!streamDiv||streamAgent!==agent||messagesDiv.lastElementChild!==streamDiv){const emptyState=messagesDiv.querySelector('.empty-state');if(emptyState)emptyState.remove();streamDiv=document.createElement('div');streamDiv.className='message assistant';const role=document.createElement('div');role.className='role';role.textContent='Agentic IDE · '+agent;const content=document.createElement('div');content.className='content';content.style.whiteSpace='pre-wrap';streamDiv.appendChild(role);streamDiv.appendChild(content);messagesDiv.appendChild(streamDiv);streamAgent=agent;}streamDiv.querySelector('.content').textContent+=chunk;messagesDiv.scrollTop=messagesDiv.scrollHeight;}
                 function showReviewPanel(plan,files){const reviewPanel=document.getElementById('reviewPanel');const filesDiv=document.getElementById('reviewFiles');filesDiv.innerHTML='<h4>Generated Files:</h4>';files.forEach(file=>{const fileItem=document.createElement('div');fileItem.className='file-item';fileItem.textContent='✓ '+file;fileItem.onclick=()=>openFile(file);filesDiv.appendChild(fileItem);});reviewPanel.classList.add('active');}
             </script>
         </body>
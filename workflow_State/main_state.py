@@ -58,10 +58,12 @@ class AgentState(TypedDict):
     generated_files: list
     last_code_agent_output: str
     target_file: Optional[str]  # ADD THIS - for target file per step
+    step_group: List[int]  # Plan indices dispatched together (independent steps)
     
     # Step completion tracking - ADD THESE
     worker_completed: bool  # Flag set by workers when they finish
     expected_file_count: int  # Number of files expected before current step
+    iterations_used: int  # LLM turns the last worker hop needed
     
     needs_review: bool  # Context agent sets this to trigger review
     user_feedback: Optional[str]  # Stores user's revision feedback
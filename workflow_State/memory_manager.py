@@ -1,6 +1,86 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Optional, Any
 from datetime import datetime
+from langchain_core.messages import SystemMessage, HumanMessage
 from workflow_State.main_state import AgentState
+from shared.agent_logging import get_logger
+from shared.llm_client import get_chat_model
+from shared.llm_throttler import llm_throttler
+
+logger = get_logger("agent.memory")
+
+# Rolling summary: once the history grows past SUMMARY_TRIGGER_TURNS, the
+# oldest SUMMARY_BATCH_TURNS turns are folded into one "summary" turn, so the
+# memory injected into every agent prompt stays bounded.
+SUMMARY_TRIGGER_TURNS = 10
+SUMMARY_BATCH_TURNS = 6
+
+# Words that make resolve_reference fall back to the file being worked on
+REFERENCE_KEYWORDS = frozenset({"it", "that", "this", "file", "script", "code"})
+_WORD_RE = re.compile(r"[a-z_]+")
+
+# Most-recent-first entries kept in state["recent_files"]
+RECENT_FILES_LIMIT = 20
+
+# Key under which build_context_for_agent memoizes its output on the state.
+# Not part of AgentState on purpose: it only lives for one node invocation.
+CONTEXT_CACHE_KEY = "_memory_context_cache"
+
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a user and a coding assistant in at most "
+    "3 sentences. Keep file names, decisions made and any unfinished requests."
+)
+
+# Summaries are written on these threads, off the agent event loop; the
+# futures are looked up by the turns they summarize, since the state itself
+# is checkpointed and can't hold them
+PENDING_SUMMARIES_LIMIT = 64
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summary")
+_pending_summaries: "OrderedDict[tuple, Future]" = OrderedDict()
+_pending_summaries_lock = threading.Lock()
+
+
+def _summary_key(turns: List[Dict[str, Any]]) -> tuple:
+    return tuple((t.get("timestamp"), t["role"], t["content"]) for t in turns)
+
+
+def _digest(turns: List[Dict[str, Any]]) -> str:
+    return " | ".join(t["content"][:80] for t in turns)
+
+
+def _write_summary(turns: List[Dict[str, Any]]) -> str:
+    """LLM summary of the turns (runs on _summary_pool); a digest if the call fails."""
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    try:
+        response = llm_throttler.invoke(
+            get_chat_model(),
+            [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=transcript)]
+        )
+        return response.content.strip()
+    except Exception as e:
+        logger.warning(f"[Memory] ⚠️  Summarization failed, keeping a short digest: {e}")
+        return _digest(turns)
+
+
+# Memory timestamps are reused for this long instead of being re-formatted
+# for every turn / file touch in a burst
+TIMESTAMP_RESOLUTION = 0.25  # seconds
+_last_timestamp = ("", 0.0)
+
+
+def _now_iso() -> str:
+    """UTC ISO timestamp, re-formatted at most every TIMESTAMP_RESOLUTION seconds."""
+    global _last_timestamp
+    now = time.time()
+    iso, formatted_at = _last_timestamp
+    if now - formatted_at >= TIMESTAMP_RESOLUTION:
+        iso = datetime.utcfromtimestamp(now).isoformat()
+        _last_timestamp = (iso, now)
+    return iso
 
 
 class MemoryManager:
@@ -50,14 +130,70 @@ class MemoryManager:
             "role": role,
             "content": content,
             "files_mentioned": files_mentioned or [],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": _now_iso()
         }
         
         state["conversation_history"].append(turn)
+        state.pop(CONTEXT_CACHE_KEY, None)
+        
+        # Fold old turns into a summary to avoid context overflow
+        if len(state["conversation_history"]) > SUMMARY_TRIGGER_TURNS:
+            MemoryManager.summarize_history(state)
+        
+        return state
+    
+    @staticmethod
+    def summarize_history(state: AgentState) -> AgentState:
+        """
+        Replace the oldest turns with a single LLM-written summary turn.
+        
+        Only the gist and the file paths survive (global memory); the turns'
+        full text is dropped. An earlier summary turn is folded in as well.
+        
+        Never waits on the LLM: the summary is written on a background thread
+        and folded in by the first call after it is ready (normally the next
+        turn). If the history reaches twice the trigger first, a plain digest
+        is used instead so memory stays bounded.
+        """
+        history = state.get("conversation_history", [])
+        oldest = history[:SUMMARY_BATCH_TURNS]
+        if not oldest:
+            return state
+        
+        key = _summary_key(oldest)
+        with _pending_summaries_lock:
+            future = _pending_summaries.get(key)
+            if future is None:
+                future = _summary_pool.submit(_write_summary, oldest)
+                _pending_summaries[key] = future
+                if len(_pending_summaries) > PENDING_SUMMARIES_LIMIT:
+                    _pending_summaries.popitem(last=False)
+        
+        if future.done():
+            summary = future.result()
+        elif len(history) >= 2 * SUMMARY_TRIGGER_TURNS:
+            summary = _digest(oldest)
+        else:
+            return state  # try again on the next turn
         
-        # Keep only last 10 turns to avoid context overflow
-        if len(state["conversation_history"]) > 10:
-            state["conversation_history"] = state["conversation_history"][-10:]
+        with _pending_summaries_lock:
+            _pending_summaries.pop(key, None)
+        
+        files = []
+        for old_turn in oldest:
+            for file_path in old_turn.get("files_mentioned", []):
+                if file_path not in files:
+                    files.append(file_path)
+        
+        summary_turn = {
+            "role": "summary",
+            "content": summary,
+            "files_mentioned": files[-RECENT_FILES_LIMIT:],  # same cap as recent_files
+            "timestamp": _now_iso()
+        }
+        state["conversation_history"] = [summary_turn] + history[SUMMARY_BATCH_TURNS:]
+        state.pop(CONTEXT_CACHE_KEY, None)
+        logger.info(f"[Memory] 🗜️  Summarized {len(oldest)} old turns")
         
         return state
     
@@ -79,26 +215,27 @@ class MemoryManager:
         """
         if "recent_files" not in state:
             state["recent_files"] = []
+        recent_files = state["recent_files"]
         
-        # Remove existing entry for this file
-        state["recent_files"] = [
-            f for f in state["recent_files"] 
-            if f["file_path"] != file_path
-        ]
+        # Remove existing entry for this file (in place - there is at most one)
+        for i, f in enumerate(recent_files):
+            if f["file_path"] == file_path:
+                del recent_files[i]
+                break
         
         # Add new entry at the front (most recent)
         file_entry = {
             "file_path": file_path,
-            "last_modified": datetime.utcnow().isoformat(),
+            "last_modified": _now_iso(),
             "operation": operation,
             "agent": agent
         }
         
-        state["recent_files"].insert(0, file_entry)
+        recent_files.insert(0, file_entry)
+        state.pop(CONTEXT_CACHE_KEY, None)
         
-        # Keep only last 20 files
-        if len(state["recent_files"]) > 20:
-            state["recent_files"] = state["recent_files"][:20]
+        # Keep only last RECENT_FILES_LIMIT files
+        del recent_files[RECENT_FILES_LIMIT:]
         
         # Update current working file
         if operation in ["created", "modified"]:
@@ -127,18 +264,11 @@ class MemoryManager:
             if file.lower() in user_lower:
                 return file
         
-        # Check for pronouns/references
-        reference_keywords = [
-            "it", "that", "this", "the file", "the script", 
-            "that file", "this file", "the code", "that code"
-        ]
-        
-        has_reference = any(keyword in user_lower for keyword in reference_keywords)
-        
-        if has_reference:
+        # Check for pronouns/references (whole words, so "with" is not "it")
+        if REFERENCE_KEYWORDS.intersection(_WORD_RE.findall(user_lower)):
             # Check current working file
             if state.get("current_working_file"):
-                print(f"[Memory] Resolved reference to: {state['current_working_file']}")
+                logger.info(f"[Memory] Resolved reference to: {state['current_working_file']}")
                 return state["current_working_file"]
             
             # Check most recently modified file
@@ -146,13 +276,13 @@ class MemoryManager:
             if recent_files:
                 most_recent = recent_files[0]
                 if most_recent["operation"] in ["created", "modified"]:
-                    print(f"[Memory] Resolved reference to most recent: {most_recent['file_path']}")
+                    logger.info(f"[Memory] Resolved reference to most recent: {most_recent['file_path']}")
                     return most_recent["file_path"]
             
             # Check generated files (most recent)
             generated = state.get("generated_files", [])
             if generated:
-                print(f"[Memory] Resolved reference to last generated: {generated[-1]}")
+                logger.info(f"[Memory] Resolved reference to last generated: {generated[-1]}")
                 return generated[-1]
         
         return None
@@ -170,20 +300,30 @@ class MemoryManager:
             Formatted conversation history
         """
         history = state.get("conversation_history", [])
-        recent = history[-last_n:] if len(history) > last_n else history
         
-        if not recent:
+        # A rolling summary (always the first turn) is shown in full
+        summary = history[0] if history and history[0]["role"] == "summary" else None
+        turns = history[1:] if summary else history
+        recent = turns[-last_n:] if len(turns) > last_n else turns
+        
+        if not recent and not summary:
             return "No previous conversation."
         
-        context = "Recent conversation:\n"
+        parts = []
+        if summary:
+            parts.append(f"Earlier conversation (summary): {summary['content']}\n")
+            if summary.get("files_mentioned"):
+                parts.append(f"  (Files: {', '.join(summary['files_mentioned'])})\n")
+        
+        parts.append("Recent conversation:\n")
         for turn in recent:
             role = turn["role"].capitalize()
             content = turn["content"][:100]  # Truncate long messages
-            context += f"{role}: {content}\n"
+            parts.append(f"{role}: {content}\n")
             if turn.get("files_mentioned"):
-                context += f"  (Files: {', '.join(turn['files_mentioned'])})\n"
+                parts.append(f"  (Files: {', '.join(turn['files_mentioned'])})\n")
         
-        return context
+        return "".join(parts)
     
     @staticmethod
     def get_file_context(state: AgentState) -> str:
@@ -198,15 +338,17 @@ class MemoryManager:
         if not recent_files:
             return "No files worked on yet."
         
-        context = "Recently worked files:\n"
-        for file_info in recent_files:
-            context += f"- {file_info['file_path']} ({file_info['operation']} by {file_info['agent']})\n"
+        parts = ["Recently worked files:\n"]
+        parts.extend(
+            f"- {file_info['file_path']} ({file_info['operation']} by {file_info['agent']})\n"
+            for file_info in recent_files
+        )
         
         current = state.get("current_working_file")
         if current:
-            context += f"\nCurrent focus: {current}\n"
+            parts.append(f"\nCurrent focus: {current}\n")
         
-        return context
+        return "".join(parts)
     
     @staticmethod
     def build_context_for_agent(state: AgentState) -> str:
@@ -215,7 +357,20 @@ class MemoryManager:
         
         Returns:
             Complete context including conversation and file history
+        
+        The result is memoized on the state; MemoryManager's update methods
+        drop the memo, and the key catches any other change in size or focus.
         """
+        cache_key = (
+            len(state.get("conversation_history", [])),
+            len(state.get("recent_files", [])),
+            state.get("current_working_file"),
+            state.get("current_step", 0),
+        )
+        cached = state.get(CONTEXT_CACHE_KEY)
+        if cached and cached[0] == cache_key:
+            return cached[1]
+        
         conversation = MemoryManager.get_conversation_context(state)
         files = MemoryManager.get_file_context(state)
         
@@ -231,4 +386,5 @@ If the user says "it", "that file", or similar references, check the current wor
 
 =========================
 """
+        state[CONTEXT_CACHE_KEY] = (cache_key, context)
         return context
\ No newline at end of file
@@ -4,7 +4,10 @@ from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage
 #from langgraph.checkpoint.memory import MemorySaver  # ← Add this import
 from langgraph.checkpoint.postgres import PostgresSaver
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
 
 from workflow_State.main_state import AgentState
 
@@ -16,6 +19,10 @@ from Debug_Agent.debug_agent_main import DebugAgent
 from Reviewer_Agent.reviewer_agent_main import ReviewerAgent
 
 
+# Nodes the Context Agent may hand off to
+VALID_NEXT_NODES = frozenset({"code_agent", "debug_agent", "reviewer_agent", "orchestrator"})
+
+
 def context_router(state: AgentState) -> str:
     """
     Context Agent is the controller:
@@ -28,8 +35,7 @@ def context_router(state: AgentState) -> str:
 
     next_node = (state.get("next_node") or "").strip().lower()
 
-    valid = {"code_agent", "debug_agent", "reviewer_agent", "orchestrator"}
-    if next_node not in valid:
+    if next_node not in VALID_NEXT_NODES:
         return "code_agent"
 
     return next_node
@@ -46,8 +52,15 @@ def orchestrator_router(state: AgentState) -> str:
     return "context_agent"
 
 
+@cache
 def create_workflow():
-    """Create the workflow graph with checkpointing support"""
+    """
+    Create the workflow graph with checkpointing support.
+
+    Compiled once per process: the graph holds no per-run state (that lives in
+    the checkpointer under each thread_id), so the returned app can be
+    streamed by any number of sessions concurrently.
+    """
     graph = StateGraph(AgentState)
 
     # Add all nodes
@@ -95,10 +108,43 @@ def create_workflow():
     checkpointer = get_checkpointer()
     return graph.compile(checkpointer=checkpointer)
 
+# Connection pool size for the checkpointer and the /health ping
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "4"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "16"))
+
+
+@cache
+def get_db_pool():
+    """
+    Process-wide PostgreSQL connection pool, or None without DATABASE_URL.
+    Shared by the checkpointer and the server's health check.
+    """
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        return None
+    
+    from psycopg_pool import ConnectionPool
+    
+    print("📡 Opening PostgreSQL connection pool...")
+    pool = ConnectionPool(
+        database_url,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        kwargs={"autocommit": True, "prepare_threshold": 0},  # ✅ autocommit required by PostgresSaver
+        open=True,
+    )
+    print("✅ Connected to PostgreSQL (autocommit enabled)")
+    return pool
+
+
+@cache
 def get_checkpointer():
     """
     Get the appropriate checkpointer based on environment.
     Uses PostgreSQL in production, in-memory for local testing without DB.
+    
+    Built once per process: checkpoints are isolated per thread_id, so every
+    workflow can share it (and setup() only runs on the first call).
     """
     database_url = os.getenv("DATABASE_URL")
     
@@ -107,16 +153,10 @@ def get_checkpointer():
         print("🗄️  Using PostgreSQL checkpointer")
         try:
             from langgraph.checkpoint.postgres import PostgresSaver
-            import psycopg
             
-            # Create a connection with autocommit enabled
-            print("📡 Connecting to PostgreSQL...")
-            conn = psycopg.connect(database_url, autocommit=True)  # ✅ Add autocommit=True
-            print("✅ Connected to PostgreSQL (autocommit enabled)")
-            
-            # Create the checkpointer with the connection
+            # Create the checkpointer on the shared pool
             print("🔧 Creating PostgresSaver...")
-            checkpointer = PostgresSaver(conn)
+            checkpointer = PostgresSaver(get_db_pool())
             
             # Setup tables
             print("📋 Setting up checkpoint tables...")
@@ -141,6 +181,35 @@ def get_checkpointer():
         from langgraph.checkpoint.memory import MemorySaver
         return MemorySaver()
 
+
+# Immutable defaults for a new workflow's state; create_initial_state copies
+# this and adds the per-request and mutable fields
+_INITIAL_STATE_TEMPLATE = {
+    "task_type": "other",
+    "focus_symbol": None,
+    "error_message": None,
+    "stack_trace": None,
+    "test_command": None,
+    "last_test_output": None,
+    "last_diff": None,
+    "active_agent": "orchestrator",
+    "done": False,
+    "current_step": 0,
+    "current_task": "",
+    "next_node": "context_agent",
+    "final_summary": "",
+    "last_code_agent_output": "",
+    "target_file": None,
+    "worker_completed": False,
+    "expected_file_count": 0,
+    "iterations_used": 0,
+    "needs_review": False,
+    "user_feedback": None,
+    "project_path": None,
+    "current_working_file": None,
+}
+
+
 def create_initial_state(user_request: str, skip_review: bool = False) -> AgentState:
     """
     Helper function to create initial state for a workflow.
@@ -154,51 +223,76 @@ def create_initial_state(user_request: str, skip_review: bool = False) -> AgentS
     Returns:
         Initial state dictionary for the workflow
     """
-    return {
-        "messages": [HumanMessage(content=user_request)],
-        "user_request": user_request,
-        "task_type": "other",
-        "target_files": [],
-        "focus_symbol": None,
-        "error_message": None,
-        "stack_trace": None,
-        "test_command": None,
-        "last_test_output": None,
-        "last_diff": None,
-        "active_agent": "orchestrator",
-        "done": False,
-        "plan": [],
-        "current_step": 0,
-        "current_task": "",
-        "next_node": "context_agent",
-        "final_summary": "",
-        "generated_files": [],
-        "last_code_agent_output": "",
-        "target_file": None,
-        "worker_completed": False,
-        "expected_file_count": 0,
-        "needs_review": False,
-        "user_feedback": None,
-        "file_contents": {},
-        "project_path": None,
-        "conversation_history": [],
-        "recent_files": [],
-        "current_working_file": None,
-        "reference_context": {},
-        "skip_review": skip_review  # ✅ Add skip_review flag
-    }
+    state = _INITIAL_STATE_TEMPLATE.copy()
+    state["messages"] = [HumanMessage(content=user_request)]
+    state["user_request"] = user_request
+    # Mutable fields get fresh objects for every workflow
+    state["target_files"] = []
+    state["plan"] = []
+    state["generated_files"] = []
+    state["step_group"] = []
+    state["file_contents"] = {}
+    state["conversation_history"] = []
+    state["recent_files"] = []
+    state["reference_context"] = {}
+    state["skip_review"] = skip_review  # ✅ Add skip_review flag
+    return state
 
 
 # ============================================
 # LangSmith Tracing Helper Functions
 # ============================================
 
+# Read once: these don't change while the process runs
+LANGSMITH_CONFIG = {
+    "project_name": os.getenv("LANGCHAIN_PROJECT", "agentic-ide-workflow"),
+    "tags": ("agentic-workflow", "vs-code-extension"),
+}
+TRACING_ENABLED = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
+
+
 def get_langsmith_config():
     """Get LangSmith configuration from environment"""
-    return {
-        "project_name": os.getenv("LANGCHAIN_PROJECT", "agentic-ide-workflow"),
-        "tags": ["agentic-workflow", "vs-code-extension"],
-    }
+    return LANGSMITH_CONFIG
+
+
+# Run tracer callbacks on LangChain's background executor instead of inline
+# in each node, unless explicitly configured otherwise
+os.environ.setdefault("LANGCHAIN_CALLBACKS_BACKGROUND", "true")
+
+
+@cache
+def get_langsmith_client():
+    """
+    One LangSmith client per process. It batches runs and uploads them from its
+    own background thread, so trace POSTs stay off the workflow's path.
+    """
+    from langsmith import Client
+    return Client(auto_batch_tracing=True)
+
+
+def _create_tracer():
+    """
+    A LangChainTracer for one workflow run. Tracers are cheap - uploads go
+    through the shared client - and a per-run tracer lets the end of a run
+    drain only that run's pending callbacks instead of every live stream's.
+    """
+    return LangChainTracer(
+        project_name=LANGSMITH_CONFIG["project_name"],
+        client=get_langsmith_client(),
+    )
+
+
+def _drain_tracer(tracer):
+    try:
+        tracer.wait_for_futures()
+    except Exception as e:
+        print(f"Note: Tracer cleanup issue (non-critical): {e}")
+
+
+# Workflows hand their tracer drains to this pool when their stream ends. Its
+# threads are joined at interpreter exit, so queued traces still get flushed
+_tracer_flush_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tracer-drain")
 
 
 def run_workflow_with_tracing(app, initial_state, config=None):
@@ -214,32 +308,38 @@ def run_workflow_with_tracing(app, initial_state, config=None):
     Yields:
         State updates from workflow execution
     """
-    langsmith_config = get_langsmith_config()
-    
-    tracing_enabled = os.getenv("LANGCHAIN_TRACING_V2", "false").lower() == "true"
+    if not TRACING_ENABLED:
+        # Nothing to set up: callbacks, tags and run_name only feed traces
+        yield from _stream_values(app, initial_state, config or {})
+        return
     
-    if tracing_enabled:
-        print("🔍 LangSmith tracing enabled")
-        print(f"📊 Project: {langsmith_config['project_name']}")
-    else:
-        print("⚠️  LangSmith tracing disabled")
+    print("🔍 LangSmith tracing enabled")
+    print(f"📊 Project: {LANGSMITH_CONFIG['project_name']}")
     
     run_config = config or {}
     
-    tracer = None
-    if tracing_enabled:
-        tracer = LangChainTracer(project_name=langsmith_config["project_name"])
-        run_config["callbacks"] = [tracer]
+    tracer = _create_tracer()
+    run_config["callbacks"] = [tracer]
     
     # Add tags
     if "tags" not in run_config:
-        run_config["tags"] = []
-    run_config["tags"].extend(langsmith_config["tags"])
+        run_config["tags"] = list(LANGSMITH_CONFIG["tags"])
+    else:
+        run_config["tags"].extend(LANGSMITH_CONFIG["tags"])
     
     # Add run name if not resuming (initial_state is not None)
     if initial_state is not None:
         run_config["run_name"] = f"workflow_{initial_state.get('user_request', '')[:50]}"
     
+    try:
+        yield from _stream_values(app, initial_state, run_config)
+    finally:
+        # Let pending trace uploads finish in the background rather than
+        # holding up the end of the stream (and the WebSocket reply) on them
+        _tracer_flush_pool.submit(_drain_tracer, tracer)
+
+
+def _stream_values(app, initial_state, run_config):
     try:
         # Stream with checkpointing support
         for state in app.stream(initial_state, config=run_config, stream_mode="values"):
@@ -247,13 +347,30 @@ def run_workflow_with_tracing(app, initial_state, config=None):
     except RecursionError as e:
         print(f"❌ Recursion limit exceeded - workflow stuck in loop")
         raise Exception("Workflow exceeded maximum steps. This usually indicates an infinite loop. Please simplify your request.")
+
+
+async def run_workflow_with_tracing_async(app, initial_state, config=None):
+    """
+    Async iterator over run_workflow_with_tracing, for the API server.
+
+    Each step is pulled on a worker thread, so the event loop keeps serving
+    WebSocket frames and other sessions while a node (LLM call) runs. The
+    graph itself is still driven synchronously: the production checkpointer
+    is the sync PostgresSaver, which app.astream() cannot use.
+    """
+    stream = run_workflow_with_tracing(app, initial_state, config=config)
+    end = object()
+    try:
+        while True:
+            state = await asyncio.to_thread(next, stream, end)
+            if state is end:
+                return
+            yield state
     finally:
-        # Ensure tracer is properly closed
-        if tracer is not None:
-            try:
-                tracer.wait_for_futures()
-            except Exception as e:
-                print(f"Note: Tracer cleanup issue (non-critical): {e}")
+        try:
+            stream.close()
+        except ValueError:
+            pass  # cancelled while a step was still running on its thread
 
 
 """
@@ -1,18 +1,41 @@
 # tools/file_tools.py
 
+import fnmatch
+import mmap
 import os
+import re
+import shutil
 from pathlib import Path
 import subprocess
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from typing import List, Optional
 
 from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from workflow_tools.parallel_tools import (
+    BATCH_TOOL_NAME,
+    execute_tool_calls,
+    flatten_batch_calls,
+    group_tool_results,
+    run_sync,
+)
+
+def _is_windows_path(path: str) -> bool:
+    return ":\\" in path or path.startswith("C:")
+
 
 # Root of the project the agents are allowed to touch.
 # You can set PROJECT_ROOT in .env, otherwise cwd is used.
 # Always use current working directory (/app on Railway)
 # Ignore PROJECT_ROOT env var if it's a Windows path
 project_root_env = os.getenv("PROJECT_ROOT", "")
-if ":\\" in project_root_env or project_root_env.startswith("C:"):
+if _is_windows_path(project_root_env):
     # Windows path - ignore it and use current directory
     PROJECT_ROOT = Path.cwd().resolve()
 else:
@@ -20,36 +43,227 @@ else:
 
 #PROJECT_ROOT = PROJECT_ROOT / 'Workflow_Testing'
 
+# Root for the workflow run in the current context. The API server sets it per
+# WebSocket run, so concurrent sessions on different projects don't share one
+# process-wide setting; unset, the tools use PROJECT_ROOT.
+project_root_var: ContextVar[Optional[Path]] = ContextVar("project_root", default=None)
+
+
+def get_project_root() -> Path:
+    return project_root_var.get() or PROJECT_ROOT
+
+
+def resolve_project_root(project_path: Optional[str]) -> Path:
+    """
+    Root to use for a session's project_path. Paths this host can't use (a
+    Windows path sent to a Linux server, or one that doesn't exist here) fall
+    back to PROJECT_ROOT, like the env setting above.
+    """
+    if not project_path or _is_windows_path(project_path):
+        return PROJECT_ROOT
+    root = Path(project_path).resolve()
+    return root if root.is_dir() else PROJECT_ROOT
+
+
 def _resolve_safe(path: str) -> Path:
     """
-    Resolve a path relative to PROJECT_ROOT and ensure we never escape the root.
+    Resolve a path relative to the project root and ensure we never escape the root.
     """
-    full_path = (PROJECT_ROOT / path).resolve()
-    if not str(full_path).startswith(str(PROJECT_ROOT)):
+    return _resolve_under(get_project_root(), path)
+
+
+# Agents keep touching the same few files, so resolutions are cached per
+# (root, path). Anything that can change what a path resolves to - new
+# directories, or a command that may have created symlinks - clears the cache.
+@lru_cache(maxsize=512)
+def _resolve_under(project_root: Path, path: str) -> Path:
+    full_path = (project_root / path).resolve()
+    # Compare against "root/" so a sibling such as /proj_evil doesn't pass
+    # for /proj
+    full_str, root_str = str(full_path), str(project_root)
+    if full_str != root_str and not full_str.startswith(os.path.join(root_str, "")):
         raise ValueError(f"Access outside project root is not allowed: {full_path}")
     return full_path
 
 
+def _make_parent_dirs(full_path: Path) -> None:
+    if not full_path.parent.exists():
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        _resolve_under.cache_clear()
+
+
+# LRU of decoded file contents keyed by (abs_path, mtime_ns, size), so the same
+# file read again by the next iteration or the next agent is served from RAM.
+# A changed file misses automatically; writes below also drop the path eagerly.
+READ_CACHE_SIZE = 256
+_read_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_read_cache_lock = threading.Lock()
+
+
+def read_text_cached(full_path) -> str:
+    """
+    Read a text file through the read cache. Costs one os.stat on a hit.
+    Relative paths are taken from the project root, like the tools do.
+    """
+    full_path = (get_project_root() / full_path).resolve()
+    stat = full_path.stat()
+    key = (str(full_path), stat.st_mtime_ns, stat.st_size)
+
+    with _read_cache_lock:
+        content = _read_cache.get(key)
+        if content is not None:
+            _read_cache.move_to_end(key)
+            return content
+
+    content = full_path.read_text(encoding="utf-8", errors="replace")
+    _cache_put(key, content)
+    return content
+
+
+def _cache_put(key: tuple, content: str) -> None:
+    with _read_cache_lock:
+        _read_cache[key] = content
+        if len(_read_cache) > READ_CACHE_SIZE:
+            _read_cache.popitem(last=False)
+
+
+def _remember_write(full_path: Path, content: str) -> None:
+    """Replace a file's cached contents with what was just written to it."""
+    _invalidate_read_cache(full_path)
+    stat = full_path.stat()
+    _cache_put((str(full_path), stat.st_mtime_ns, stat.st_size), content)
+
+
+def _invalidate_read_cache(full_path: Path) -> None:
+    """
+    Drop every cached version of a file after it has been written, along with
+    the cached listings / search results that may include it.
+    """
+    path_key = str(full_path)
+    with _read_cache_lock:
+        for key in [k for k in _read_cache if k[0] == path_key]:
+            del _read_cache[key]
+    _clear_fs_cache()
+
+
+# Listing / search results, reused for FS_CACHE_TTL seconds: agents tend to
+# repeat the same list_files / search_text calls within a step. Every tool
+# that changes files (write_file, append_file, apply_patch, run_command)
+# clears it; read_file has its own mtime-checked cache above.
+FS_CACHE_TTL = 5.0
+FS_CACHE_SIZE = 128
+_fs_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_fs_cache_lock = threading.Lock()
+
+
+def _cached_fs(func):
+    """Cache func's results per (project root, args) through _fs_cache."""
+    @wraps(func)
+    def wrapper(*args):
+        key = (func.__name__, get_project_root(), args)
+        now = time.monotonic()
+        with _fs_cache_lock:
+            entry = _fs_cache.get(key)
+            if entry is not None and now - entry[0] <= FS_CACHE_TTL:
+                _fs_cache.move_to_end(key)
+                return entry[1]
+
+        result = func(*args)
+        with _fs_cache_lock:
+            _fs_cache[key] = (now, result)
+            _fs_cache.move_to_end(key)
+            if len(_fs_cache) > FS_CACHE_SIZE:
+                _fs_cache.popitem(last=False)
+        return result
+    return wrapper
+
+
+def _clear_fs_cache() -> None:
+    with _fs_cache_lock:
+        _fs_cache.clear()
+
+
+# Dependency, VCS and build directories: never descended into by list_files or
+# search_text, where they only add traversal time and junk results
+SKIPPED_DIRS = frozenset({
+    ".git", "node_modules", "__pycache__", ".venv", "venv", "dist", "build",
+    ".mypy_cache", ".pytest_cache", ".next", ".tox",
+})
+
+
+def _iter_files(base: Path):
+    """
+    Yield an os.DirEntry for every file under base, files of a directory
+    before its subdirectories. Like os.walk it skips unreadable directories
+    and doesn't descend into symlinked ones, but the file/dir type comes from
+    the directory listing instead of a stat per entry. SKIPPED_DIRS below
+    base are pruned.
+    """
+    stack = [str(base)]
+    while stack:
+        subdirs = []
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIPPED_DIRS:
+                            subdirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+
+
+def _iter_files_by_path(base: Path):
+    """
+    Like _iter_files, but entries of each directory are visited in name order,
+    files and subdirectories interleaved - the order `rg --sort path` reports
+    them in, so both search backends return the same matches.
+    """
+    stack = [str(base)]
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, str):
+            yield item
+            continue
+        children = []
+        try:
+            with os.scandir(item) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIPPED_DIRS:
+                            children.append((entry.name, entry.path))
+                    elif entry.is_file():
+                        children.append((entry.name, entry))
+        except OSError:
+            continue
+        children.sort(key=lambda child: child[0])
+        stack.extend(child for _, child in reversed(children))
+
+
 @tool
 def list_files(relative_dir: str = ".") -> str:
     """
     List files under the given directory (relative to project root).
     Returns a newline-separated list of paths.
     """
+    return _list_files(relative_dir)
+
+
+@_cached_fs
+def _list_files(relative_dir: str) -> str:
     try:
         base = _resolve_safe(relative_dir)
         if not base.exists():
             return f"ERROR: directory does not exist: {relative_dir}"
 
+        root_prefix = os.path.join(str(get_project_root()), "")
         paths = []
         # Limit number of files to avoid giant responses
         max_files = 300
-        for root, _, files in os.walk(str(base)):
-            for name in files:
-                rel = Path(root, name).relative_to(PROJECT_ROOT)
-                paths.append(str(rel))
-                if len(paths) >= max_files:
-                    break
+        for entry in _iter_files(base):
+            paths.append(entry.path[len(root_prefix):])
             if len(paths) >= max_files:
                 break
 
@@ -72,7 +286,16 @@ def read_file(path: str, max_chars: int = 8000) -> str:
         if not full_path.exists():
             return f"ERROR: file does not exist: {path}"
 
-        content = full_path.read_text(encoding="utf-8", errors="replace")
+        # A file that can't fit in max_chars anyway (UTF-8 is at most 4 bytes
+        # per char) is only read as far as needed, and isn't cached
+        size = full_path.stat().st_size
+        if size > 4 * max_chars:
+            with full_path.open("r", encoding="utf-8", errors="replace") as f:
+                content = f.read(max_chars)
+            remaining_bytes = size - len(content.encode("utf-8"))
+            return content + f"\n\n...[TRUNCATED, ~{remaining_bytes} more bytes]..."
+
+        content = read_text_cached(full_path)
         if len(content) > max_chars:
             return content[:max_chars] + f"\n\n...[TRUNCATED, {len(content) - max_chars} more chars]..."
         return content
@@ -89,14 +312,32 @@ def write_file(path: str, content: str, create_dirs: bool = True) -> str:
     try:
         full_path = _resolve_safe(path)
         if create_dirs:
-            full_path.parent.mkdir(parents=True, exist_ok=True)
+            _make_parent_dirs(full_path)
 
         full_path.write_text(content, encoding="utf-8")
+        _remember_write(full_path, content)
         return f"File written: {path}"
     except Exception as e:
         return f"ERROR in write_file: {e}"
 
 
+def _append_bytes(full_path: Path, content: str) -> None:
+    """
+    Append text with a raw os.open/os.write instead of a text-mode file
+    object; appends are usually small, so the buffered I/O stack was most of
+    the cost. Newlines are translated like text mode would.
+    """
+    if os.linesep != "\n":
+        content = content.replace("\n", os.linesep)
+    data = memoryview(content.encode("utf-8"))
+    fd = os.open(full_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)  # umask applies, as with open()
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+
 @tool
 def append_file(path: str, content: str, create_dirs: bool = True) -> str:
     """
@@ -106,43 +347,161 @@ def append_file(path: str, content: str, create_dirs: bool = True) -> str:
     try:
         full_path = _resolve_safe(path)
         if create_dirs:
-            full_path.parent.mkdir(parents=True, exist_ok=True)
+            _make_parent_dirs(full_path)
 
-        with full_path.open("a", encoding="utf-8") as f:
-            f.write(content)
+        _append_bytes(full_path, content)
+        _invalidate_read_cache(full_path)
         return f"Appended to file: {path}"
     except Exception as e:
         return f"ERROR in append_file: {e}"
 
 
+# ripgrep binary, if installed; search_text uses it and falls back to Python
+_RG = shutil.which("rg")
+_RG_SKIP_GLOBS = [arg for name in sorted(SKIPPED_DIRS) for arg in ("-g", f"!{name}/")]
+
+
+def _search_with_rg(query: str, file_glob: str, max_results: int, project_root: Path) -> Optional[List[str]]:
+    """
+    Run search_text's search with ripgrep, formatted like the Python scan.
+    Returns None if ripgrep failed, so the caller can fall back.
+
+    --no-ignore/--hidden and the SKIPPED_DIRS globs keep the file set the
+    same as the Python scan's (which doesn't read .gitignore); binary files
+    are skipped. --sort path makes the output order deterministic and the
+    same as the Python scan's, so cutting it at max_results keeps the same
+    matches (-m only limits matches per file).
+    """
+    try:
+        completed = subprocess.run(
+            [_RG, "--fixed-strings", "--line-number", "--no-heading", "--null",
+             "--no-ignore", "--hidden", "--no-messages", "--sort", "path",
+             "-g", file_glob, *_RG_SKIP_GLOBS, "-m", str(max_results), "--", query, "."],
+            cwd=str(project_root),
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+    # Exit code 1 means no matches
+    if completed.returncode not in (0, 1):
+        return None
+
+    matches = []
+    for output_line in completed.stdout.splitlines():
+        # "./path\0<line number>:<text>"
+        path, _, rest = output_line.partition("\0")
+        line_number, _, text = rest.partition(":")
+        matches.append(f"{path.removeprefix('./')}:{line_number}: {text.strip()}")
+        if len(matches) >= max_results:
+            break
+    return matches
+
+
+# Files at least this big are searched through mmap; smaller ones are cheaper
+# to just read line by line
+MMAP_SEARCH_MIN_SIZE = 4096
+
+
+def _scan_file(path: str, rel_path: str, query: str, limit: int) -> List[str]:
+    """Up to `limit` "path:line: text" matches of query in one file."""
+    matches = []
+    if os.path.getsize(path) < MMAP_SEARCH_MIN_SIZE:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for i, line in enumerate(f, start=1):
+                if query in line:
+                    matches.append(f"{rel_path}:{i}: {line.strip()}")
+                    if len(matches) >= limit:
+                        break
+        return matches
+
+    # Jump from hit to hit with mmap.find, decoding only the matching lines
+    needle = query.encode("utf-8")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        pos = 0
+        line_number, counted_to = 1, 0
+        while pos < size and len(matches) < limit:
+            hit = mm.find(needle, pos)
+            if hit == -1:
+                break
+            line_start = mm.rfind(b"\n", 0, hit) + 1
+            line_end = mm.find(b"\n", hit)
+            if line_end == -1:
+                line_end = size
+            line_number += mm[counted_to:line_start].count(b"\n")
+            counted_to = line_start
+            text = mm[line_start:line_end].decode("utf-8", errors="ignore")
+            matches.append(f"{rel_path}:{line_number}: {text.strip()}")
+            pos = line_end + 1
+    return matches
+
+
+def _scan_file_quietly(path: str, rel_path: str, query: str, limit: int) -> List[str]:
+    try:
+        return _scan_file(path, rel_path, query, limit)
+    except Exception:
+        # Ignore unreadable files
+        return []
+
+
+# Files are scanned on these threads (reads and mmap.find release the GIL);
+# at most SEARCH_WINDOW scans are queued ahead of the results being used
+SEARCH_WORKERS = os.cpu_count() or 4
+SEARCH_WINDOW = 4 * SEARCH_WORKERS
+_search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+
+
+def _search_with_python(query: str, file_glob: str, max_results: int, project_root: Path) -> List[str]:
+    """
+    Scan used when ripgrep isn't available. Files are scanned concurrently,
+    but results are taken in path order, so the output is the same as a
+    sequential scan's - and as ripgrep's.
+    """
+    root_prefix = os.path.join(str(project_root), "")
+    # Parsed once, not per file
+    glob_re = re.compile(fnmatch.translate(file_glob))
+    matches = []
+    pending = deque()
+    for entry in _iter_files_by_path(project_root):
+        if not glob_re.match(entry.name):
+            continue
+        rel_path = entry.path[len(root_prefix):]
+        pending.append(_search_pool.submit(_scan_file_quietly, entry.path, rel_path, query, max_results))
+
+        if len(pending) >= SEARCH_WINDOW:
+            matches.extend(pending.popleft().result())
+            if len(matches) >= max_results:
+                break
+
+    while pending and len(matches) < max_results:
+        matches.extend(pending.popleft().result())
+    for future in pending:
+        future.cancel()
+    return matches[:max_results]
+
+
 @tool
 def search_text(query: str, file_glob: str = "*.py", max_results: int = 50) -> str:
     """
     Search for a text query across project files matching file_glob (e.g. '*.py', '*.ts').
     Returns up to max_results matches with file path and line numbers.
     """
-    try:
-        matches = []
-        for root, _, files in os.walk(str(PROJECT_ROOT)):
-            for name in files:
-                if not Path(name).match(file_glob):
-                    continue
-                full_path = Path(root, name)
-                rel_path = full_path.relative_to(PROJECT_ROOT)
-
-                try:
-                    with full_path.open("r", encoding="utf-8", errors="ignore") as f:
-                        for i, line in enumerate(f, start=1):
-                            if query in line:
-                                matches.append(f"{rel_path}:{i}: {line.strip()}")
-                                if len(matches) >= max_results:
-                                    break
-                except Exception:
-                    # Ignore unreadable files
-                    continue
+    return _search_text(query, file_glob, max_results)
 
-            if len(matches) >= max_results:
-                break
+
+@_cached_fs
+def _search_text(query: str, file_glob: str, max_results: int) -> str:
+    try:
+        project_root = get_project_root()
+        matches = _search_with_rg(query, file_glob, max_results, project_root) if _RG else None
+        if matches is None:
+            matches = _search_with_python(query, file_glob, max_results, project_root)
 
         if not matches:
             return f"No matches found for '{query}' in files matching '{file_glob}'."
@@ -152,6 +511,11 @@ def search_text(query: str, file_glob: str = "*.py", max_results: int = 50) -> s
         return f"ERROR in search_text: {e}"
 
 
+# apply_patch works on bytes for files at least this big; below it, encoding
+# the snippets costs more than the search saves
+PATCH_BYTES_THRESHOLD = 64 * 1024
+
+
 @tool
 def apply_patch(
     path: str,
@@ -176,21 +540,40 @@ def apply_patch(
         if not full_path.exists():
             return f"ERROR: file does not exist: {path}"
 
-        content = full_path.read_text(encoding="utf-8")
+        # Big files are patched as bytes: bytes.find is a plain memchr/memmem
+        # scan, and the file never has to be decoded
+        as_bytes = full_path.stat().st_size >= PATCH_BYTES_THRESHOLD
+        if as_bytes:
+            content = full_path.read_bytes()
+            if b"\r" in content:
+                # Same newline translation read_text does on the str path
+                content = content.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+            old, new = original_snippet.encode("utf-8"), new_snippet.encode("utf-8")
+        else:
+            content = full_path.read_text(encoding="utf-8")
+            old, new = original_snippet, new_snippet
 
         idx = -1
         start = 0
         for _ in range(occurrence):
-            idx = content.find(original_snippet, start)
+            idx = content.find(old, start)
             if idx == -1:
                 return (
                     f"ERROR: original_snippet not found (occurrence {occurrence}) "
                     f"in file: {path}"
                 )
-            start = idx + len(original_snippet)
-
-        new_content = content[:idx] + new_snippet + content[idx + len(original_snippet):]
-        full_path.write_text(new_content, encoding="utf-8")
+            start = idx + len(old)
+
+        new_content = content[:idx] + new + content[idx + len(old):]
+        if as_bytes:
+            # Newlines go back out as os.linesep, as write_text does below
+            if os.linesep != "\n":
+                new_content = new_content.replace(b"\n", os.linesep.encode("ascii"))
+            full_path.write_bytes(new_content)
+            _invalidate_read_cache(full_path)
+        else:
+            full_path.write_text(new_content, encoding="utf-8")
+            _remember_write(full_path, new_content)
 
         return (
             f"Patch applied to {path} (replaced occurrence {occurrence} of "
@@ -200,6 +583,31 @@ def apply_patch(
         return f"ERROR in apply_patch: {e}"
 
 
+def _read_pipe(pipe, keep: int, captured: dict) -> None:
+    """
+    Read a pipe to EOF, keeping only its first `keep` bytes, so a chatty
+    command neither blocks on a full pipe nor fills memory. Stores the kept
+    bytes and the total size in captured["data"] / captured["total"].
+    """
+    kept = bytearray()
+    total = 0
+    with pipe:
+        while True:
+            chunk = os.read(pipe.fileno(), 65536)
+            if not chunk:
+                break
+            total += len(chunk)
+            if len(kept) < keep:
+                kept += chunk[:keep - len(kept)]
+    captured["data"] = bytes(kept)
+    captured["total"] = total
+
+
+def _decode_output(data: bytes) -> str:
+    """Decode command output like text=True would (universal newlines)."""
+    return data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+
 @tool
 def run_command(cmd: str, cwd: Optional[str] = None, timeout: int = 120) -> str:
     """
@@ -211,30 +619,92 @@ def run_command(cmd: str, cwd: Optional[str] = None, timeout: int = 120) -> str:
 
     Returns combined stdout and stderr (truncated if too long).
     """
+    max_chars = 8000
     try:
-        workdir = PROJECT_ROOT if cwd is None else _resolve_safe(cwd)
+        workdir = get_project_root() if cwd is None else _resolve_safe(cwd)
 
-        completed = subprocess.run(
+        deadline = time.monotonic() + timeout
+        proc = subprocess.Popen(
             cmd,
             shell=True,
             cwd=str(workdir),
-            capture_output=True,
-            text=True,
-            timeout=timeout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
         )
 
+        # Each stream is drained on its own thread so neither pipe fills up;
+        # only the first max_chars bytes of each are kept
+        stdout, stderr = {}, {}
+        readers = [
+            threading.Thread(target=_read_pipe, args=(pipe, max_chars, captured), daemon=True)
+            for pipe, captured in ((proc.stdout, stdout), (proc.stderr, stderr))
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            proc.wait(timeout=timeout)
+            # Background children of the shell can keep the pipes open
+            for reader in readers:
+                reader.join(max(0, deadline - time.monotonic()))
+                if reader.is_alive():
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise
+
         output = (
-            f"Exit code: {completed.returncode}\n"
-            f"--- STDOUT ---\n{completed.stdout}\n"
-            f"--- STDERR ---\n{completed.stderr}"
+            f"Exit code: {proc.returncode}\n"
+            f"--- STDOUT ---\n{_decode_output(stdout['data'])}\n"
+            f"--- STDERR ---\n{_decode_output(stderr['data'])}"
         )
 
-        max_chars = 8000
+        dropped = stdout["total"] - len(stdout["data"]) + stderr["total"] - len(stderr["data"])
         if len(output) > max_chars:
-            return output[:max_chars] + f"\n\n...[TRUNCATED, {len(output) - max_chars} more chars]..."
+            return output[:max_chars] + f"\n\n...[TRUNCATED, {len(output) - max_chars + dropped} more chars]..."
 
         return output
     except subprocess.TimeoutExpired:
         return f"ERROR: command timed out after {timeout} seconds: {cmd}"
     except Exception as e:
         return f"ERROR in run_command: {e}"
+    finally:
+        # The command may have created directories or symlinks, or changed files
+        _resolve_under.cache_clear()
+        _clear_fs_cache()
+
+
+class ToolInvocation(BaseModel):
+    tool_name: str = Field(
+        description="Tool to run: list_files, read_file, write_file, apply_patch or search_text"
+    )
+    arguments: dict = Field(default_factory=dict, description="Keyword arguments for that tool")
+
+
+@tool(BATCH_TOOL_NAME)
+def batch(invocations: List[ToolInvocation]) -> str:
+    """
+    Run several independent tool calls in a single step; they execute concurrently.
+    Prefer this over calling the same tools one at a time when the calls do not
+    depend on each other (e.g. reading three files, or writing two new files).
+
+    - invocations: list of {"tool_name": ..., "arguments": {...}}.
+
+    Returns each invocation's result, numbered in the order given.
+    """
+    try:
+        payload = [
+            inv if isinstance(inv, dict) else inv.model_dump()
+            for inv in invocations
+        ]
+        batch_call = {"name": BATCH_TOOL_NAME, "args": {"invocations": payload}, "id": BATCH_TOOL_NAME}
+        flat_calls = flatten_batch_calls([batch_call])
+        results = run_sync(execute_tool_calls(flat_calls, _BATCHABLE_TOOLS))
+        return group_tool_results([batch_call], flat_calls, results)[0][1]
+    except Exception as e:
+        return f"ERROR in batch: {e}"
+
+
+# Tools that may appear inside a batch invocation.
+_BATCHABLE_TOOLS = {
+    t.name: t for t in [list_files, read_file, write_file, apply_patch, search_text]
+}
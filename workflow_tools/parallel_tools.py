@@ -0,0 +1,278 @@
+# workflow_tools/parallel_tools.py
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import orjson
+from langchain_core.messages import AIMessage, ToolMessage, message_chunk_to_message
+
+# Set ENABLE_PARALLEL_TOOLS=false to fall back to one-at-a-time tool execution.
+ENABLE_PARALLEL_TOOLS = os.getenv("ENABLE_PARALLEL_TOOLS", "true").lower() == "true"
+
+# Name of the meta-tool that lets the LLM request several invocations at once.
+BATCH_TOOL_NAME = "batch"
+
+
+# Receives (agent, text) for every LLM token streamed by stream_tool_calls.
+# Set by the API server around a WebSocket run; unset everywhere else.
+llm_token_sink: contextvars.ContextVar = contextvars.ContextVar("llm_token_sink", default=None)
+
+
+_agent_loop = None
+_agent_loop_lock = threading.Lock()
+
+
+def _get_agent_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) the long-lived event loop the async agent code runs on."""
+    global _agent_loop
+    with _agent_loop_lock:
+        if _agent_loop is None:
+            _agent_loop = asyncio.new_event_loop()
+            threading.Thread(target=_agent_loop.run_forever, name="agent-loop", daemon=True).start()
+        return _agent_loop
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+
+    LangGraph nodes are plain functions, but the API server drives the graph
+    from inside an async handler, so an event loop may already be running on
+    this thread. Coroutines are therefore handed to one process-wide agent loop
+    on its own thread; keeping a single loop also lets the shared async HTTP
+    client (shared.llm_client) reuse its connections across calls.
+    """
+    loop = _get_agent_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+
+    # The coroutine sees the caller's context variables (project root, token
+    # sink), as it would with asyncio.to_thread
+    context = contextvars.copy_context()
+
+    if running is loop:
+        # Called from code already on the agent loop - blocking it would
+        # deadlock, so use a throwaway loop on a worker thread instead
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(context.run, asyncio.run, coro).result()
+
+    return asyncio.run_coroutine_threadsafe(_in_context(context, coro), loop).result()
+
+
+async def _in_context(context: contextvars.Context, coro):
+    """Run coro with the given context's variables (tasks on the agent loop start from the loop's own)."""
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def _chain_key(index: int, tool_args: Dict[str, Any]):
+    """Calls on the same file share a key; everything else is independent."""
+    path = tool_args.get("path")
+    if path:
+        return os.path.normpath(path)
+    return ("call", index)
+
+
+async def execute_tool_calls(tool_calls: List[dict], tool_map: Dict[str, Any]) -> List[Any]:
+    """
+    Execute all tool calls from one LLM turn concurrently.
+
+    Calls that touch the same path are chained in their original order (so a
+    read_file after a write_file on that file still sees the write); independent
+    chains run in parallel on worker threads since the tools are blocking I/O.
+
+    Returns one entry per tool call, in the same order as tool_calls, holding
+    either the tool's result or the exception it raised. Keeping the order lets
+    callers pair results with tool_call_id exactly as before.
+    """
+    chains: Dict[Any, List[int]] = {}
+    for i, tool_call in enumerate(tool_calls):
+        chains.setdefault(_chain_key(i, tool_call["args"]), []).append(i)
+
+    results: List[Any] = [None] * len(tool_calls)
+
+    async def run_chain(indices: List[int]):
+        for i in indices:
+            tool_name = tool_calls[i]["name"]
+            tool = tool_map.get(tool_name)
+            if tool is None:
+                results[i] = f"Unknown tool: {tool_name}"
+                continue
+            try:
+                results[i] = await asyncio.to_thread(tool.invoke, tool_calls[i]["args"])
+            except Exception as e:
+                results[i] = e
+
+    if ENABLE_PARALLEL_TOOLS:
+        await asyncio.gather(*(run_chain(indices) for indices in chains.values()))
+    else:
+        await run_chain(list(range(len(tool_calls))))
+    return results
+
+
+def flatten_batch_calls(tool_calls: List[dict]) -> List[dict]:
+    """
+    Expand `batch` meta-tool calls into their individual invocations.
+
+    Every returned call carries a "parent_id": the tool_call_id the LLM is
+    waiting on. Plain calls are their own parent; batch members share the id
+    of the batch call that contained them.
+    """
+    flat = []
+    for tool_call in tool_calls:
+        if tool_call["name"] != BATCH_TOOL_NAME:
+            flat.append({**tool_call, "parent_id": tool_call["id"]})
+            continue
+
+        for n, invocation in enumerate(tool_call["args"].get("invocations") or []):
+            if not isinstance(invocation, dict):
+                invocation = {}
+            flat.append({
+                "name": invocation.get("tool_name", ""),
+                "args": invocation.get("arguments") or {},
+                "id": f"{tool_call['id']}:{n}",
+                "parent_id": tool_call["id"],
+            })
+    return flat
+
+
+def format_result(result: Any) -> str:
+    """Render a tool result (or the exception it raised) for a ToolMessage."""
+    if isinstance(result, Exception):
+        return f"Error: {str(result)}"
+    return str(result)
+
+
+def group_tool_results(tool_calls: List[dict], flat_calls: List[dict], results: List[Any]) -> List[tuple]:
+    """
+    Fold flattened results back into one (tool_call_id, content) pair per
+    original tool call, in the order the LLM issued them.
+    """
+    grouped: Dict[str, List[tuple]] = {}
+    for flat_call, result in zip(flat_calls, results):
+        grouped.setdefault(flat_call["parent_id"], []).append((flat_call, result))
+
+    messages = []
+    for tool_call in tool_calls:
+        members = grouped.get(tool_call["id"], [])
+        if tool_call["name"] != BATCH_TOOL_NAME:
+            messages.append((tool_call["id"], format_result(members[0][1])))
+            continue
+
+        parts = [
+            f"[{n}] {flat_call['name']}: {format_result(result)}"
+            for n, (flat_call, result) in enumerate(members)
+        ]
+        messages.append((tool_call["id"], "\n\n".join(parts) or "Empty batch: no invocations given"))
+    return messages
+
+
+# Tool outputs up to this size are kept verbatim when older turns are digested
+DIGEST_KEEP_CHARS = 200
+
+
+def digest_tool_messages(messages: List[Any]) -> None:
+    """
+    Replace the ToolMessages already in `messages` with one-line digests such
+    as "read_file(foo.py) -> 3421 chars", in place.
+
+    Called before a turn's fresh results are appended, so only the latest
+    outputs travel in full and each request stays roughly constant in size
+    instead of re-sending every earlier tool output.
+    """
+    calls = {}
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            calls[tool_call["id"]] = tool_call
+
+    for i, message in enumerate(messages):
+        if not isinstance(message, ToolMessage) or len(str(message.content)) <= DIGEST_KEEP_CHARS:
+            continue
+
+        tool_call = calls.get(message.tool_call_id, {})
+        args = tool_call.get("args") or {}
+        if tool_call.get("name") == BATCH_TOOL_NAME:
+            target = f"{len(args.get('invocations') or [])} calls"
+        else:
+            target = args.get("path", "")
+        digest = f"[earlier output] {tool_call.get('name', 'tool')}({target}) -> {len(str(message.content))} chars"
+        messages[i] = ToolMessage(content=digest, tool_call_id=message.tool_call_id)
+
+
+async def stream_tool_calls(model, messages: list, tool_map: Dict[str, Any], agent: str = ""):
+    """
+    Stream one LLM turn and start each tool call as soon as its arguments are
+    complete, instead of waiting for the whole response.
+
+    A tool call's JSON is known to be closed once the next tool call index
+    appears in the stream; the last one is dispatched when the stream ends.
+    Calls touching a path that an earlier call of this turn also touches wait
+    for that call first, preserving the ordering execute_tool_calls guarantees.
+
+    Text tokens are also handed to llm_token_sink (if set) as they arrive.
+    
+    Returns (message, flat_calls, results) where message is the full AIMessage
+    and flat_calls/results are in the order of message.tool_calls.
+    """
+    sink = llm_token_sink.get()
+    dispatched: Dict[str, tuple] = {}
+    last_by_path: Dict[str, asyncio.Task] = {}
+
+    async def run_after(previous: List[asyncio.Task], flat: List[dict]):
+        if previous:
+            await asyncio.gather(*previous, return_exceptions=True)
+        return await execute_tool_calls(flat, tool_map)
+
+    def dispatch(tool_call: dict):
+        flat = flatten_batch_calls([tool_call])
+        paths = {os.path.normpath(c["args"]["path"]) for c in flat if c["args"].get("path")}
+        previous = [last_by_path[p] for p in paths if p in last_by_path]
+        task = asyncio.create_task(run_after(previous, flat))
+        for p in paths:
+            last_by_path[p] = task
+        dispatched[tool_call["id"]] = (flat, task)
+
+    response = None
+    async for chunk in model.astream(messages):
+        response = chunk if response is None else response + chunk
+        if sink is not None and isinstance(chunk.content, str) and chunk.content:
+            sink(agent, chunk.content)
+        if not ENABLE_PARALLEL_TOOLS:
+            continue
+
+        # Every tool call except the newest one has finished streaming
+        for call_chunk in (response.tool_call_chunks or [])[:-1]:
+            call_id = call_chunk.get("id")
+            if not call_id or call_id in dispatched:
+                continue
+            try:
+                args = orjson.loads(call_chunk.get("args") or "{}")
+            except orjson.JSONDecodeError:
+                continue  # leave it for the final, fully parsed message
+            if isinstance(args, dict):
+                dispatch({"name": call_chunk.get("name") or "", "args": args, "id": call_id})
+
+    message = message_chunk_to_message(response) if response is not None else AIMessage(content="")
+
+    if not ENABLE_PARALLEL_TOOLS:
+        flat_calls = flatten_batch_calls(message.tool_calls)
+        return message, flat_calls, await execute_tool_calls(flat_calls, tool_map)
+
+    for tool_call in message.tool_calls:
+        if tool_call["id"] not in dispatched:
+            dispatch(tool_call)
+
+    flat_calls: List[dict] = []
+    results: List[Any] = []
+    for tool_call in message.tool_calls:
+        flat, task = dispatched[tool_call["id"]]
+        flat_calls.extend(flat)
+        results.extend(await task)
+    return message, flat_calls, results